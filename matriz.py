@@ -1,19 +1,32 @@
 
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib import colors
-from fpdf import FPDF
 import os
 import sys
+import itertools
+import math
+import multiprocessing
+import numbers
+import json
+import gzip
+import pickle
+import sqlite3
 import unicodedata
+import threading
+import bisect
+import heapq
+import importlib.util
+import queue
+import time
+import urllib.error
+import urllib.request
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
-from reportlab.pdfgen import canvas
+# reportlab y Flask se importan al usarse (PDF / servidor), no al arrancar
 # --------------------
 # RUTAS ABSOLUTAS
 # --------------------
@@ -35,35 +48,1618 @@ ARCHIVO_TALLER = CARPETA_EXCEL / "taller.xlsx"
 ARCHIVO_COTIZACIONES = CARPETA_EXCEL / "cotizaciones.xlsx"
 ARCHIVO_MOTOS = CARPETA_EXCEL / "motos_insumos.xlsx"
 # --------------------
+# ALMACENAMIENTO
+# --------------------
+# "excel" (por defecto) guarda cada tabla en su .xlsx; "sqlite" usa ARCHIVO_BD y deja
+# los .xlsx solo para importar/exportar
+BACKEND_ALMACENAMIENTO = os.environ.get("JQ_ALMACENAMIENTO", "excel").strip().lower()
+ARCHIVO_BD = CARPETA_DATOS / "jq_motors.db"
+# Cada cuántos segundos (o movimientos) se vuelcan los diarios a sus .xlsx
+INTERVALO_COMPACTACION = 60
+MAX_MOVIMIENTOS_DIARIO = 500
+TAM_BLOQUE_IMPORTACION = 5000  # filas por bloque al importar un Excel grande
+# Copia binaria de cada .xlsx en <carpeta>/.cache para no parsear el XML en cada arranque.
+# Feather si está pyarrow; si no, pickle. El Excel sigue siendo el archivo de intercambio.
+# find_spec no importa pyarrow: solo se carga cuando se lee o escribe una cache
+FORMATO_CACHE = "feather" if importlib.util.find_spec("pyarrow") else "pickle"
+# --------------------
 # Funciones auxiliares
 # --------------------
 def quitar_acentos(texto):
     if not isinstance(texto, str):
         return texto
     return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+def normalizar_codigo(codigo):
+    # Clave de búsqueda de un código: sin acentos, sin espacios y en mayúsculas
+    return quitar_acentos(str(codigo)).strip().upper()
 def _create_empty_excel(path: Path, columns):
     df = pd.DataFrame(columns=columns)
     df.to_excel(path, index=False, engine="openpyxl")
-def load_file(path: Path, columns):
-    if path.exists():
+def reemplazar_atomico(path, escribir):
+    # escribir(tmp) crea el archivo completo; después se reemplaza de golpe (un corte no deja medio archivo)
+    path = Path(path)
+    tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+    try:
+        escribir(tmp)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+    return path
+def _texto_excel(valor):
+    """
+    El texto que daría read_excel(dtype=str) para un valor escrito con to_excel: openpyxl guarda
+    los números con "%.16g" y pandas lee los enteros (2.0) como 2.
+    """
+    if valor is None or valor is pd.NaT or (isinstance(valor, float) and valor != valor):
+        return ""
+    if isinstance(valor, (bool, str)):
+        return str(valor)
+    if isinstance(valor, numbers.Real):
+        if math.isinf(valor):
+            return "inf" if valor > 0 else "-inf"
+        valor = float("%.16g" % valor)
+        return str(int(valor)) if valor.is_integer() else str(valor)
+    return str(valor)
+def _texto_celda(valor):
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    return str(valor)
+# --------------------
+# DIARIO DE MOVIMIENTOS
+# --------------------
+class DiarioJSONL:
+    """
+    Registro de solo-anexar (una línea JSON por movimiento, con fsync).
+    rotar() aparta lo escrito hasta ahora para compactarlo sin bloquear nuevos movimientos.
+    """
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta_rotada = self.ruta.with_name(self.ruta.name + ".compactando")
+        self.lock = threading.Lock()
+        self.pendientes = 0
+        # Si la app se cerró a mitad de una línea, la siguiente empieza en renglón nuevo
+        if self.ruta.exists() and self.ruta.stat().st_size:
+            with open(self.ruta, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def anexar(self, registro):
+        self.anexar_lote([registro])
+
+    def anexar_lote(self, registros):
+        # Una sola escritura y un solo fsync para todo el lote
+        texto = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in registros)
+        with self.lock:
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(texto)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pendientes += len(registros)
+
+    def leer(self, solo_rotado=False):
+        registros = []
+        for ruta in (self.ruta_rotada,) if solo_rotado else (self.ruta_rotada, self.ruta):
+            if not ruta.exists():
+                continue
+            with open(ruta, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        registros.append(json.loads(linea))
+                    except ValueError:
+                        continue  # línea incompleta por un corte
+        return registros
+
+    def rotar(self):
+        with self.lock:
+            if self.ruta.exists():
+                if self.ruta_rotada.exists():
+                    # Quedó una compactación a medias: se juntan ambos en orden
+                    with open(self.ruta_rotada, "a", encoding="utf-8") as dst, open(self.ruta, encoding="utf-8") as src:
+                        dst.write(src.read())
+                    os.remove(self.ruta)
+                else:
+                    os.replace(self.ruta, self.ruta_rotada)
+            self.pendientes = 0
+
+    def descartar_rotado(self):
+        if self.ruta_rotada.exists():
+            os.remove(self.ruta_rotada)
+# Orden con el que se vuelcan las filas anexadas: tabla -> (columna, categorías)
+ORDEN_TABLAS = {"ventas": ("Forma_Pago", ["Efectivo", "Tarjeta", "Transferencia"])}
+def ordenar_tabla(path: Path, df: pd.DataFrame):
+    orden = ORDEN_TABLAS.get(Path(path).stem)
+    if not orden or orden[0] not in df.columns:
+        return df
+    col, categorias = orden
+    claves = pd.Categorical(df[col], categories=categorias, ordered=True)
+    return df.iloc[pd.Series(claves.codes).replace(-1, len(categorias)).argsort(kind="stable").to_numpy()]
+def aplicar_cambios_hojas(hojas, cambios):
+    # cambios: registros de actualizar_hojas, en orden ({"hoja", "columnas", "filas"} o {"hoja", "borrar"})
+    hojas = dict(hojas)
+    for cambio in cambios:
+        if cambio.get("borrar"):
+            hojas.pop(cambio["hoja"], None)
+        else:
+            hojas[cambio["hoja"]] = pd.DataFrame(cambio["filas"], columns=cambio["columnas"])
+    return hojas
+class AlmacenExcel:
+    """
+    Cada tabla es un .xlsx en CARPETA_EXCEL (comportamiento original).
+    Las filas anexadas (ventas, cotizaciones) van a <tabla>.pendiente.jsonl y se vuelcan al
+    .xlsx en segundo plano, sin releer el historial en cada venta.
+    Los libros de varias hojas (taller) hacen lo mismo por hoja con <libro>.hojas.jsonl.
+    self.lock solo protege los diccionarios (nunca se tiene durante una escritura); cada archivo
+    tiene su propio candado para leerlo y reescribirlo. Anexar no toma ninguno de los dos por más
+    que un instante: una venta no espera a que se reescriba ventas.xlsx.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._candados = {}
+        self._diarios = {}
+        self._diarios_hojas = {}
+        self._temporizadores = {}
+
+    def _candado(self, path: Path):
+        # Candado del archivo: lectura (libro + diario) y volcado no se cruzan
+        with self.lock:
+            if path not in self._candados:
+                self._candados[path] = threading.RLock()
+            return self._candados[path]
+
+    def _diario(self, path: Path):
+        with self.lock:
+            if path not in self._diarios:
+                self._diarios[path] = DiarioJSONL(path.with_name(path.stem + ".pendiente.jsonl"))
+            return self._diarios[path]
+
+    def _diario_hojas(self, path: Path):
+        with self.lock:
+            if path not in self._diarios_hojas:
+                self._diarios_hojas[path] = DiarioJSONL(path.with_name(path.stem + ".hojas.jsonl"))
+            return self._diarios_hojas[path]
+
+    def _programar(self, clave, volcar, path):
+        # Un temporizador por archivo: los cambios de los próximos segundos se vuelcan juntos
+        with self.lock:
+            if clave not in self._temporizadores:
+                t = threading.Timer(INTERVALO_COMPACTACION, self._volcar_seguro, args=(volcar, path))
+                t.daemon = True
+                self._temporizadores[clave] = t
+                t.start()
+
+    def _volcar_seguro(self, volcar, path):
+        # Si un volcado falla, el diario queda como está (con su .compactando) y se reintenta
+        # en el siguiente; el error no debe tumbar el temporizador ni el cierre de la app
         try:
-            return pd.read_excel(path, engine="openpyxl", dtype=str).fillna("")
+            volcar(path)
+        except Exception as e:
+            print(f"No se pudieron volcar los pendientes de {path.name}: {e}")
+
+    def cargar(self, path: Path, columns):
+        diario = self._diario(path)
+        with self._candado(path):
+            df = self._leer(path, columns)
+            pendientes = diario.leer()
+        if pendientes:
+            df = pd.concat([df, pd.DataFrame(pendientes).fillna("").astype(str)], ignore_index=True)
+        return df
+
+    # -------- copia binaria (cache) de cada .xlsx --------
+    def _huella(self, path: Path):
+        # Tamaño y fecha del .xlsx: si el usuario lo edita a mano, la cache deja de valer
+        st = path.stat()
+        return f"{st.st_size}-{st.st_mtime_ns}"
+
+    def _ruta_cache(self, path: Path, huella, tipo):
+        extension = "feather" if tipo == "tabla" and FORMATO_CACHE == "feather" else "pkl"
+        return path.parent / ".cache" / f"{path.stem}.{tipo}.{huella}.{extension}"
+
+    def _leer_cache(self, path: Path, tipo):
+        try:
+            ruta = self._ruta_cache(path, self._huella(path), tipo)
+            if not ruta.exists():
+                return None
+            if ruta.suffix == ".feather":
+                return pd.read_feather(ruta)
+            with open(ruta, "rb") as f:
+                return pickle.load(f)
         except Exception:
+            return None  # cache dañada o de otra versión: se vuelve a leer el Excel
+
+    def _escribir_cache(self, path: Path, tipo, datos):
+        try:
+            ruta = self._ruta_cache(path, self._huella(path), tipo)
+            ruta.parent.mkdir(exist_ok=True)
+            tmp = ruta.with_name(ruta.name + ".tmp")
+            if ruta.suffix == ".feather":
+                datos.reset_index(drop=True).to_feather(tmp)
+            else:
+                with open(tmp, "wb") as f:
+                    pickle.dump(datos, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, ruta)
+            # Borrar las copias de versiones anteriores del mismo archivo
+            for vieja in ruta.parent.glob(f"{path.stem}.{tipo}.*"):
+                if vieja != ruta:
+                    vieja.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"No se pudo escribir la cache de {path.name}: {e}")
+
+    def _leer(self, path: Path, columns):
+        if path.exists():
+            df = self._leer_cache(path, "tabla")
+            if df is not None:
+                return df
+            try:
+                df = pd.read_excel(path, engine="openpyxl", dtype=str).fillna("")
+            except Exception:
+                return pd.DataFrame(columns=columns)
+            self._escribir_cache(path, "tabla", df)
+            return df
+        else:
+            _create_empty_excel(path, columns)
             return pd.DataFrame(columns=columns)
-    else:
-        _create_empty_excel(path, columns)
-        return pd.DataFrame(columns=columns)
+
+    def guardar(self, path: Path, df: pd.DataFrame):
+        with self._candado(path):
+            # Se escribe a un temporal y se reemplaza de golpe: un corte a medias no deja el Excel dañado
+            tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+            df.to_excel(tmp, index=False, engine="openpyxl")
+            os.replace(tmp, path)
+            # La cache guarda lo mismo que devolvería read_excel(dtype=str): todo texto, celda por celda
+            # (también en columnas object, donde puede haber floats de Python mezclados con texto)
+            texto = pd.DataFrame({str(col): [_texto_excel(v) for v in df[col].tolist()] for col in df.columns},
+                                 index=range(len(df)), dtype=object)
+            self._escribir_cache(path, "tabla", texto)
+
+    def anexar(self, path: Path, df: pd.DataFrame):
+        self._diario(path).anexar_lote(df.to_dict("records"))
+        self._programar(path, self.volcar_anexos, path)
+
+    def volcar_anexos(self, path: Path):
+        diario = self._diario(path)
+        with self.lock:
+            self._temporizadores.pop(path, None)
+        # Solo el candado del archivo: las filas nuevas siguen entrando al diario mientras tanto
+        with self._candado(path):
+            diario.rotar()
+            filas = diario.leer(solo_rotado=True)
+            if filas:
+                df = pd.concat([self._leer(path, []), pd.DataFrame(filas)], ignore_index=True)
+                self.guardar(path, ordenar_tabla(path, df))
+            diario.descartar_rotado()
+
+    def volcar_pendientes(self):
+        for path in list(self._diarios):
+            self._volcar_seguro(self.volcar_anexos, path)
+        for path in list(self._diarios_hojas):
+            self._volcar_seguro(self.volcar_hojas, path)
+
+    def version(self, path: Path):
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _leer_hojas(self, path: Path):
+        if not path.exists():
+            return {}
+        hojas = self._leer_cache(path, "hojas")
+        if hojas is None:
+            hojas = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+            self._escribir_cache(path, "hojas", hojas)
+        return hojas
+
+    def cargar_hojas(self, path: Path):
+        diario = self._diario_hojas(path)
+        with self._candado(path):
+            hojas = self._leer_hojas(path)
+            cambios = diario.leer()
+        return aplicar_cambios_hojas(hojas, cambios) if cambios else hojas
+
+    def _escribir_hojas(self, path: Path, hojas):
+        if not hojas:
+            # Un libro de Excel necesita al menos una hoja: sin hojas no queda archivo
+            # (cargar_hojas de un archivo que no existe devuelve {})
+            path.unlink(missing_ok=True)
+            for vieja in (path.parent / ".cache").glob(f"{path.stem}.hojas.*"):
+                vieja.unlink(missing_ok=True)
+            return
+        def escribir(tmp):
+            with pd.ExcelWriter(tmp, engine="openpyxl") as writer:
+                for hoja, df in hojas.items():
+                    df.to_excel(writer, sheet_name=hoja[:31], index=False)
+        reemplazar_atomico(path, escribir)
+        self._escribir_cache(path, "hojas", {hoja[:31]: df.copy() for hoja, df in hojas.items()})
+
+    def actualizar_hojas(self, path: Path, hojas, borradas=()):
+        # Solo se anexan las hojas que cambiaron; el libro se reescribe después, en segundo plano
+        cambios = [{"hoja": hoja, "columnas": [str(c) for c in df.columns], "filas": df.to_dict("records")}
+                   for hoja, df in hojas.items()]
+        cambios += [{"hoja": hoja, "borrar": True} for hoja in borradas]
+        if not cambios:
+            return
+        self._diario_hojas(path).anexar_lote(cambios)
+        self._programar((path, "hojas"), self.volcar_hojas, path)
+
+    def volcar_hojas(self, path: Path):
+        diario = self._diario_hojas(path)
+        with self.lock:
+            self._temporizadores.pop((path, "hojas"), None)
+        with self._candado(path):
+            diario.rotar()
+            cambios = diario.leer(solo_rotado=True)
+            if cambios:
+                self._escribir_hojas(path, aplicar_cambios_hojas(self._leer_hojas(path), cambios))
+            diario.descartar_rotado()
+
+    def volcar_movimientos(self, path: Path, movimientos, foto: pd.DataFrame):
+        # En Excel no hay escrituras puntuales: se reescribe la foto completa
+        self.guardar(path, foto)
+class AlmacenSQLite:
+    """
+    Una tabla SQLite por archivo (con el nombre del .xlsx), en modo WAL para que el hilo
+    de Flask pueda leer mientras la app escribe. Si la tabla no existe se importa del Excel.
+    """
+    INDICES = {
+        "inventario": ["codigo"],
+        "ventas": ["Código", "Forma_Pago"],
+        "cotizaciones": ["Código", "fecha"],
+        "taller": ["_hoja", "codigo"],
+        "motos_insumos": ["_hoja", "codigo"],
+    }
+
+    def __init__(self, ruta_bd: Path):
+        self.ruta_bd = Path(ruta_bd)
+        self._local = threading.local()
+        self._excel = AlmacenExcel()
+        with self._conexion() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS _versiones (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _conexion(self):
+        # Una conexión por hilo
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta_bd, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def _q(nombre):
+        return '"' + str(nombre).replace('"', '""') + '"'
+
+    @staticmethod
+    def _tabla(path):
+        return Path(path).stem
+
+    def _existe(self, con, tabla):
+        return con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (tabla,)).fetchone() is not None
+
+    def _columnas(self, con, tabla):
+        return [r[1] for r in con.execute(f"PRAGMA table_info({self._q(tabla)})")]
+
+    def _marcar(self, con, tabla):
+        con.execute("INSERT INTO _versiones VALUES (?, 1) "
+                    "ON CONFLICT(tabla) DO UPDATE SET version = version + 1", (tabla,))
+
+    def _insertar(self, con, tabla, df):
+        if not len(df):
+            return
+        cols = ", ".join(self._q(c) for c in df.columns)
+        marcas = ", ".join("?" * len(df.columns))
+        filas = ([_texto_celda(v) for v in fila] for fila in df.itertuples(index=False, name=None))
+        con.executemany(f"INSERT INTO {self._q(tabla)} ({cols}) VALUES ({marcas})", filas)
+
+    def _escribir(self, con, tabla, df):
+        q = self._q
+        con.execute(f"DROP TABLE IF EXISTS {q(tabla)}")
+        if len(df.columns):
+            con.execute(f"CREATE TABLE {q(tabla)} ({', '.join(q(c) + ' TEXT' for c in df.columns)})")
+            self._insertar(con, tabla, df)
+            for col in self.INDICES.get(tabla, []):
+                if col in df.columns:
+                    con.execute(f"CREATE INDEX {q('ix_' + tabla + '_' + col)} ON {q(tabla)} ({q(col)})")
+        self._marcar(con, tabla)
+
+    def _leer(self, con, tabla):
+        return pd.read_sql_query(f"SELECT * FROM {self._q(tabla)} ORDER BY rowid", con).fillna("")
+
+    def cargar(self, path: Path, columns):
+        con = self._conexion()
+        tabla = self._tabla(path)
+        with con:
+            if not self._existe(con, tabla):
+                df = self._excel._leer(path, columns) if path.exists() else pd.DataFrame(columns=columns)
+                self._escribir(con, tabla, df)
+                return df
+            return self._leer(con, tabla)
+
+    def guardar(self, path: Path, df: pd.DataFrame):
+        con = self._conexion()
+        with con:
+            self._escribir(con, self._tabla(path), df)
+
+    def anexar(self, path: Path, df: pd.DataFrame):
+        con = self._conexion()
+        tabla = self._tabla(path)
+        with con:
+            if not self._existe(con, tabla):
+                self._escribir(con, tabla, df)
+                return
+            existentes = self._columnas(con, tabla)
+            for col in df.columns:
+                if col not in existentes:
+                    con.execute(f"ALTER TABLE {self._q(tabla)} ADD COLUMN {self._q(col)} TEXT")
+            self._insertar(con, tabla, df)
+            self._marcar(con, tabla)
+
+    def volcar_pendientes(self):
+        pass  # en SQLite las filas anexadas ya están en su tabla
+
+    def version(self, path: Path):
+        fila = self._conexion().execute("SELECT version FROM _versiones WHERE tabla=?", (self._tabla(path),)).fetchone()
+        return fila[0] if fila else None
+
+    def cargar_hojas(self, path: Path):
+        con = self._conexion()
+        tabla = self._tabla(path)
+        with con:
+            if not self._existe(con, tabla):
+                hojas = self._excel.cargar_hojas(path)
+                self._escribir_hojas(con, tabla, hojas)
+                return hojas
+            df = self._leer(con, tabla)
+        if "_hoja" not in df.columns:
+            return {}
+        return {hoja: grupo.drop(columns="_hoja").reset_index(drop=True)
+                for hoja, grupo in df.groupby("_hoja", sort=False)}
+
+    def _escribir_hojas(self, con, tabla, hojas):
+        partes = [df.assign(_hoja=hoja) for hoja, df in hojas.items()]
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=["_hoja"])
+        self._escribir(con, tabla, df)
+
+    def actualizar_hojas(self, path: Path, hojas, borradas=()):
+        # Solo se borran y vuelven a insertar las filas de las hojas que cambiaron
+        con = self._conexion()
+        tabla, q = self._tabla(path), self._q
+        if not self._existe(con, tabla):
+            self.cargar_hojas(path)  # la primera vez se importa el Excel
+        with con:
+            con.executemany(f"DELETE FROM {q(tabla)} WHERE _hoja=?", [(h,) for h in [*hojas, *borradas]])
+            partes = [df.assign(_hoja=hoja) for hoja, df in hojas.items() if len(df)]
+            if partes:
+                df = pd.concat(partes, ignore_index=True)
+                existentes = self._columnas(con, tabla)
+                for col in df.columns:
+                    if col not in existentes:
+                        con.execute(f"ALTER TABLE {q(tabla)} ADD COLUMN {q(col)} TEXT")
+                self._insertar(con, tabla, df)
+            self._marcar(con, tabla)
+
+    def volcar_movimientos(self, path: Path, movimientos, foto: pd.DataFrame, clave="codigo"):
+        # Escrituras puntuales: solo se tocan las filas de los códigos que cambiaron
+        con = self._conexion()
+        tabla, q = self._tabla(path), self._q
+        with con:
+            if not self._existe(con, tabla):
+                self._escribir(con, tabla, foto)
+                return
+            existentes = set(self._columnas(con, tabla))
+            for mov in movimientos:
+                codigo = _texto_celda(mov.get(clave, ""))
+                if mov.get("op") == "borrar":
+                    con.execute(f"DELETE FROM {q(tabla)} WHERE {q(clave)}=?", (codigo,))
+                    continue
+                campos = {k: _texto_celda(v) for k, v in mov.get("campos", {}).items() if k in existentes}
+                actualizado = False
+                if campos:
+                    asignaciones = ", ".join(f"{q(k)}=?" for k in campos)
+                    cur = con.execute(f"UPDATE {q(tabla)} SET {asignaciones} WHERE {q(clave)}=?",
+                                      (*campos.values(), codigo))
+                    actualizado = cur.rowcount > 0
+                else:
+                    actualizado = con.execute(f"SELECT 1 FROM {q(tabla)} WHERE {q(clave)}=?", (codigo,)).fetchone() is not None
+                if not actualizado:
+                    fila = dict(campos)
+                    fila.setdefault(clave, codigo)
+                    cols = ", ".join(q(k) for k in fila)
+                    con.execute(f"INSERT INTO {q(tabla)} ({cols}) VALUES ({', '.join('?' * len(fila))})",
+                                tuple(fila.values()))
+            self._marcar(con, tabla)
+ALMACEN = AlmacenSQLite(ARCHIVO_BD) if BACKEND_ALMACENAMIENTO == "sqlite" else AlmacenExcel()
+def load_file(path: Path, columns):
+    return ALMACEN.cargar(path, columns)
 def obtener_estado_codigo(codigo, cantidad_total):
     try:
         return int(cantidad_total), 0
     except Exception:
         return 0, 0
+def obtener_estado_codigos(codigos: pd.Series, cantidades: pd.Series):
+    # Versión por columnas de obtener_estado_codigo: (libres, en_taller)
+    return cantidades, pd.Series(0, index=cantidades.index)
+def preparar_filas_inventario(df: pd.DataFrame):
+    """
+    Tuplas (codigo, descripcion, ubicacion, stock, precio, libres, en_taller, nuevas_entradas)
+    para la tabla de Stock. Las conversiones se hacen una vez por columna, no por fila.
+    """
+    if df.empty:
+        return []
+    def columna(nombre, defecto):
+        return df[nombre] if nombre in df.columns else pd.Series(defecto, index=df.index)
+    codigo = columna("codigo", "")
+    stock = pd.to_numeric(columna("stock", 0), errors="coerce").fillna(0).astype(int)
+    precio = pd.to_numeric(columna("precio", 0), errors="coerce").fillna(0)
+    libres, en_taller = obtener_estado_codigos(codigo, stock)
+    return list(zip(
+        codigo.tolist(),
+        columna("descripcion", "").tolist(),
+        columna("ubicacion", "").tolist(),
+        stock.tolist(),
+        precio.tolist(),
+        libres.tolist(),
+        en_taller.tolist(),
+        columna("nuevas_entradas", 0).tolist(),
+    ))
 def save_df(path: Path, df: pd.DataFrame):
-    df.to_excel(path, index=False, engine="openpyxl")
+    ALMACEN.guardar(path, df)
+def append_df(path: Path, df: pd.DataFrame):
+    ALMACEN.anexar(path, df)
+def load_sheets(path: Path):
+    return ALMACEN.cargar_hojas(path)
+def update_sheets(path: Path, hojas, borradas=()):
+    # Reemplaza solo las hojas dadas y quita las borradas; el resto del libro no se toca
+    ALMACEN.actualizar_hojas(path, hojas, borradas)
+def file_version(path: Path):
+    # Cambia cada vez que el archivo/tabla se modifica (mtime en Excel, contador en SQLite)
+    return ALMACEN.version(path)
 def load_inventario_file():
     return load_file(ARCHIVO_INVENTARIO, ["codigo", "descripcion", "ubicacion", "stock", "precio"])
-def load_ventas_file():
-    return load_file(ARCHIVO_VENTAS, ["fecha", "forma_pago", "codigo", "cantidad", "p_unitario", "precio", "total"])
+# --------------------
+# BUSCADOR DE CÓDIGOS Y DESCRIPCIONES
+# --------------------
+class BuscadorInventario:
+    """
+    Índice de búsqueda sobre códigos y descripciones normalizados.
+    Trigramas para buscar subcadenas y listas ordenadas para prefijos; se actualiza fila por fila.
+    """
+    def __init__(self):
+        self._textos = {}      # etiqueta -> (codigo, descripcion) normalizados
+        self._trigramas = {}   # trigrama -> {etiquetas}
+        self._codigos = []     # [(codigo, etiqueta)] ordenada
+        self._palabras = []    # [(palabra de la descripción, etiqueta)] ordenada
+
+    @staticmethod
+    def _trigramas_de(texto):
+        return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+    def _indexar(self, etiqueta, codigo, descripcion):
+        cod, desc = normalizar_codigo(codigo), normalizar_codigo(descripcion)
+        self._textos[etiqueta] = (cod, desc)
+        for t in self._trigramas_de(cod) | self._trigramas_de(desc):
+            self._trigramas.setdefault(t, set()).add(etiqueta)
+        return cod, desc
+
+    @classmethod
+    def construir(cls, etiquetas, codigos, descripciones):
+        # Carga inicial: se ordena una sola vez al final
+        buscador = cls()
+        for etiqueta, codigo, descripcion in zip(etiquetas, codigos, descripciones):
+            cod, desc = buscador._indexar(etiqueta, codigo, descripcion)
+            buscador._codigos.append((cod, etiqueta))
+            buscador._palabras.extend((p, etiqueta) for p in set(desc.split()))
+        buscador._codigos.sort()
+        buscador._palabras.sort()
+        return buscador
+
+    def agregar(self, etiqueta, codigo, descripcion):
+        self.quitar(etiqueta)
+        cod, desc = self._indexar(etiqueta, codigo, descripcion)
+        bisect.insort(self._codigos, (cod, etiqueta))
+        for p in set(desc.split()):
+            bisect.insort(self._palabras, (p, etiqueta))
+
+    def quitar(self, etiqueta):
+        if etiqueta not in self._textos:
+            return
+        cod, desc = self._textos.pop(etiqueta)
+        for t in self._trigramas_de(cod) | self._trigramas_de(desc):
+            grupo = self._trigramas.get(t)
+            if grupo is not None:
+                grupo.discard(etiqueta)
+                if not grupo:
+                    del self._trigramas[t]
+        self._quitar_ordenado(self._codigos, (cod, etiqueta))
+        for p in set(desc.split()):
+            self._quitar_ordenado(self._palabras, (p, etiqueta))
+
+    @staticmethod
+    def _quitar_ordenado(lista, elemento):
+        i = bisect.bisect_left(lista, elemento)
+        if i < len(lista) and lista[i] == elemento:
+            del lista[i]
+
+    @staticmethod
+    def _prefijo(lista, texto):
+        i = bisect.bisect_left(lista, (texto,))
+        while i < len(lista) and lista[i][0].startswith(texto):
+            yield lista[i][1]
+            i += 1
+
+    @staticmethod
+    def _rango(texto, cod, desc, campos):
+        # Menor es mejor: código exacto, prefijo de código, prefijo de descripción, palabra, subcadena
+        if "codigo" in campos:
+            if cod == texto:
+                return 0
+            if cod.startswith(texto):
+                return 1
+        if "descripcion" in campos:
+            if desc.startswith(texto):
+                return 2
+            if (" " + texto) in (" " + desc):
+                return 3
+        if "codigo" in campos and texto in cod:
+            return 4
+        if "descripcion" in campos and texto in desc:
+            return 5
+        return None
+
+    def buscar(self, texto, limite=None, campos=("codigo", "descripcion")):
+        texto = normalizar_codigo(texto)
+        if not texto:
+            return []
+        if len(texto) >= 3:
+            grupos = [self._trigramas.get(t) for t in self._trigramas_de(texto)]
+            if not all(grupos):
+                return []
+            grupos.sort(key=len)
+            candidatos = grupos[0].intersection(*grupos[1:])
+        else:
+            # Con 1 o 2 letras solo se buscan prefijos de código y de palabras
+            candidatos = set()
+            if "codigo" in campos:
+                candidatos.update(self._prefijo(self._codigos, texto))
+            if "descripcion" in campos:
+                candidatos.update(self._prefijo(self._palabras, texto))
+        resultados = []
+        for etiqueta in candidatos:
+            cod, desc = self._textos[etiqueta]
+            rango = self._rango(texto, cod, desc, campos)
+            if rango is not None:
+                resultados.append((rango, len(cod), cod, etiqueta))
+        mejores = heapq.nsmallest(limite, resultados) if limite else sorted(resultados)
+        return [r[-1] for r in mejores]
+# --------------------
+# INVENTARIO EN MEMORIA
+# --------------------
+class FotoInventario:
+    """
+    Inventario congelado en una versión: lo leen las peticiones web sin tomar el candado.
+    Nunca se modifica; cuando el inventario cambia se crea otra.
+    """
+    def __init__(self, df, indice, version, etag):
+        self.df = df
+        self.version = version
+        self.etag = etag
+        self._indice = dict(indice)
+        self.codigos = sorted(self._indice)
+
+    def consultar(self, limite=None, cursor=None, campos=None, prefijo=None, ubicacion=None, stock_menor=None):
+        """
+        Página del inventario ordenada por código. cursor: último código entregado (normalizado).
+        Devuelve (registros, cursor siguiente o None).
+        """
+        df = self.df
+        codigos = self.codigos
+        inicio, fin = 0, len(codigos)
+        if prefijo:
+            p = normalizar_codigo(prefijo)
+            inicio, fin = bisect.bisect_left(codigos, p), bisect.bisect_left(codigos, p + "\uffff")
+        if cursor:
+            inicio = max(inicio, bisect.bisect_right(codigos, cursor))
+        claves = codigos[inicio:fin]
+        sub = df.loc[[self._indice[c] for c in claves]]
+        filtro = pd.Series(True, index=sub.index)
+        if ubicacion:
+            filtro &= sub["ubicacion"].astype(str).str.strip().str.upper() == ubicacion.strip().upper()
+        if stock_menor is not None:
+            filtro &= pd.to_numeric(sub["stock"], errors="coerce").fillna(0) < stock_menor
+        sub = sub[filtro.to_numpy()]
+        claves = [c for c, ok in zip(claves, filtro.to_numpy()) if ok]
+        siguiente = None
+        if limite is not None and len(sub) > limite:
+            sub = sub.iloc[:limite]
+            siguiente = claves[limite - 1]
+        if campos:
+            sub = sub[[c for c in campos if c in sub.columns]]
+        return sub.to_dict(orient="records"), siguiente
+
+class InventarioStore:
+    """
+    Inventario compartido por todas las pestañas y el servidor Flask.
+    El Excel se lee una sola vez y solo se vuelve a leer si cambia su fecha de modificación.
+    Mantiene un índice código normalizado -> etiqueta de fila para búsquedas en O(1).
+    Los cambios se anotan en un diario (inventario.diario.jsonl) y se vuelcan al Excel en segundo plano.
+    """
+    def __init__(self, ruta=ARCHIVO_INVENTARIO):
+        self.ruta = Path(ruta)
+        self.lock = threading.RLock()
+        self.version = 0
+        self.epoca = format(time.time_ns(), "x")  # distingue esta sesión en los ETag
+        self.diario = DiarioJSONL(self.ruta.with_name(self.ruta.stem + ".diario.jsonl"))
+        self._df = None
+        self._mtime = None
+        self._indice = {}
+        self._siguiente = 0
+        self._buscador = None
+        self.repetidos = {}
+        self._foto = None    # FotoInventario de la última versión publicada
+        self._oyentes = []   # funciones llamadas con la nueva versión en cada cambio
+        self._lock_compactar = threading.Lock()
+        self._temporizador = None
+        self._escribiendo = False  # compactar() está reescribiendo el archivo fuera del candado
+        self._compactando = False  # hay un hilo de compactación lanzado por _programar_compactacion
+
+    def _mtime_archivo(self):
+        return file_version(self.ruta)
+
+    def suscribir(self, oyente):
+        # oyente(version) se llama con el candado tomado: debe ser rápido (avisar a otro hilo)
+        self._oyentes.append(oyente)
+
+    def _cambio(self):
+        self.version += 1
+        for oyente in self._oyentes:
+            oyente(self.version)
+
+    def sincronizar(self):
+        # Recarga solo si otro proceso (o el usuario) modificó el archivo
+        with self.lock:
+            # Mientras compactar() escribe, el cambio de fecha/versión del archivo es nuestro:
+            # recargar perdería lo que solo está en memoria (p. ej. los bloques importados)
+            if self._df is None or (not self._escribiendo and self._mtime_archivo() != self._mtime):
+                self._df = load_file(self.ruta, ["codigo", "descripcion", "ubicacion", "stock", "precio"])
+                self._mtime = self._mtime_archivo()
+                self._reindexar()
+                # Movimientos aún no volcados al Excel
+                movimientos = self.diario.leer()
+                for mov in movimientos:
+                    self._aplicar(mov)
+                if movimientos:
+                    self._programar_compactacion()
+                self._cambio()
+            return self._df
+
+    def _reindexar(self):
+        # Si un código se repite, las búsquedas usan la última fila (igual que en la tabla);
+        # las anteriores se conservan tal cual en memoria y en el archivo
+        self._df = self._df.reset_index(drop=True)
+        self.repetidos = {}  # código normalizado -> etiquetas de las filas anteriores
+        if "codigo" in self._df.columns:
+            codigos = [normalizar_codigo(c) for c in self._df["codigo"]]
+            self._indice = dict(zip(codigos, self._df.index))
+            if len(self._indice) < len(codigos):
+                for c, idx in zip(codigos, self._df.index):
+                    if self._indice[c] != idx:
+                        self.repetidos.setdefault(c, []).append(idx)
+                print(f"Aviso: {len(self.repetidos)} código(s) repetido(s) en {self.ruta.name}: "
+                      f"{', '.join(list(self.repetidos)[:10])}")
+        else:
+            self._indice = {}
+        self._siguiente = len(self._df)
+        self._buscador = None  # se reconstruye en la siguiente búsqueda de texto
+
+    def buscar(self, codigo):
+        # Etiqueta de la fila con ese código, o None
+        with self.lock:
+            self.sincronizar()
+            return self._indice.get(normalizar_codigo(codigo))
+
+    def fila(self, codigo):
+        with self.lock:
+            idx = self.buscar(codigo)
+            return None if idx is None else self._df.loc[idx]
+
+    def _buscador_listo(self):
+        if self._buscador is None:
+            df = self._df
+            self._buscador = BuscadorInventario.construir(
+                df.index,
+                df["codigo"] if "codigo" in df.columns else [""] * len(df),
+                df["descripcion"] if "descripcion" in df.columns else [""] * len(df))
+        return self._buscador
+
+    def buscar_texto(self, texto, limite=None, campos=("codigo", "descripcion")):
+        # Etiquetas de las filas que contienen el texto, de mejor a peor coincidencia
+        with self.lock:
+            self.sincronizar()
+            return self._buscador_listo().buscar(texto, limite, campos)
+
+    def sugerencias(self, texto, limite=8, campos=("codigo", "descripcion")):
+        with self.lock:
+            df = self._df
+            return [(df.at[i, "codigo"], df.at[i, "descripcion"])
+                    for i in self.buscar_texto(texto, limite, campos)]
+
+    # -------- cambios en memoria (sin diario) --------
+    def _agregar_fila(self, registro):
+        df = self._df
+        idx = self._siguiente
+        self._siguiente += 1
+        df.loc[idx] = [registro.get(c, "") for c in df.columns]
+        self._indice[normalizar_codigo(registro.get("codigo", ""))] = idx
+        if self._buscador is not None:
+            self._buscador.agregar(idx, registro.get("codigo", ""), registro.get("descripcion", ""))
+        return idx
+
+    def _actualizar_fila(self, idx, campos):
+        df = self._df
+        if "codigo" in campos:
+            self._indice.pop(normalizar_codigo(df.at[idx, "codigo"]), None)
+            self._indice[normalizar_codigo(campos["codigo"])] = idx
+        for col, valor in campos.items():
+            df.at[idx, col] = valor
+        if self._buscador is not None and ("codigo" in campos or "descripcion" in campos):
+            self._buscador.agregar(idx, df.at[idx, "codigo"], df.at[idx, "descripcion"])
+
+    def _borrar_filas(self, etiquetas):
+        self._df.drop(index=etiquetas, inplace=True)
+        if self._buscador is not None:
+            for idx in etiquetas:
+                self._buscador.quitar(idx)
+
+    @staticmethod
+    def _texto(campos):
+        # Todas las columnas son texto, como las deja read_excel(dtype=str): nunca "2" junto a 2
+        return {col: _texto_excel(valor) for col, valor in campos.items()}
+
+    def _aplicar(self, mov):
+        # Los movimientos guardan valores finales (no deltas): reaplicarlos no cambia el resultado
+        mov = dict(mov, campos=self._texto(mov.get("campos", {})))
+        idx = self._indice.get(normalizar_codigo(mov.get("codigo", "")))
+        if mov.get("op") == "borrar":
+            if idx is not None:
+                clave = normalizar_codigo(mov["codigo"])
+                self._indice.pop(clave)
+                self._borrar_filas([idx] + self.repetidos.pop(clave, []))
+        elif idx is None:
+            self._agregar_fila(dict(mov.get("campos", {}), codigo=mov.get("codigo", "")))
+        else:
+            self._actualizar_fila(idx, mov.get("campos", {}))
+
+    # -------- cambios con diario --------
+    def agregar(self, registro):
+        registro = self._texto(registro)
+        with self.lock:
+            self.sincronizar()
+            self.diario.anexar({"op": "fijar", "codigo": registro.get("codigo", ""), "campos": registro})
+            idx = self._agregar_fila(registro)
+            self._cambio()
+            return idx
+
+    def actualizar(self, idx, campos):
+        campos = self._texto(campos)
+        with self.lock:
+            df = self.sincronizar()
+            self.diario.anexar({"op": "fijar", "codigo": df.at[idx, "codigo"], "campos": campos})
+            self._actualizar_fila(idx, campos)
+            self._cambio()
+
+    def descontar_lote(self, cantidades: pd.Series):
+        """
+        Resta de golpe las unidades vendidas. cantidades: código normalizado -> unidades.
+        Devuelve los códigos que no existen en el inventario.
+        """
+        with self.lock:
+            df = self.sincronizar()
+            encontrados = cantidades[[c in self._indice for c in cantidades.index]]
+            etiquetas = [self._indice[c] for c in encontrados.index]
+            if etiquetas:
+                actual = pd.to_numeric(df.loc[etiquetas, "stock"], errors="coerce").fillna(0).astype(int)
+                nuevo = [str(int(v)) for v in (actual.to_numpy() - encontrados.to_numpy()).clip(min=0)]
+                self.diario.anexar_lote([{"op": "fijar", "codigo": df.at[i, "codigo"], "campos": {"stock": v}}
+                                         for i, v in zip(etiquetas, nuevo)])
+                df.loc[etiquetas, "stock"] = nuevo
+                self._cambio()
+            return [c for c in cantidades.index if c not in self._indice]
+
+    def borrar(self, codigos):
+        with self.lock:
+            df = self.sincronizar()
+            etiquetas = []
+            for c in codigos:
+                clave = normalizar_codigo(c)
+                idx = self._indice.pop(clave, None)
+                if idx is not None:
+                    self.diario.anexar({"op": "borrar", "codigo": df.at[idx, "codigo"]})
+                    # Borrar un código quita todas sus filas, también las repetidas
+                    etiquetas += [idx] + self.repetidos.pop(clave, [])
+            if etiquetas:
+                self._borrar_filas(etiquetas)
+                self._cambio()
+            return len(etiquetas)
+
+    def importar_bloque(self, bloque):
+        """
+        Alta o actualización de un bloque de filas importadas (columna codigo obligatoria).
+        No pasa por el diario: la importación termina con compactar(completo=True).
+        """
+        with self.lock:
+            df = self.sincronizar()
+            bloque = bloque.assign(_clave=[normalizar_codigo(c) for c in bloque["codigo"]])
+            bloque = bloque.drop_duplicates("_clave", keep="last")
+            columnas = [c for c in bloque.columns if c != "_clave"]
+            bloque = bloque.assign(**{col: [_texto_excel(v) for v in bloque[col].tolist()] for col in columnas})
+            for col in columnas:
+                if col not in df.columns:
+                    df[col] = ""
+            etiquetas = bloque["_clave"].map(self._indice)
+            existentes = etiquetas.notna().to_numpy()
+            if existentes.any():
+                df.loc[etiquetas[existentes].astype(int).to_numpy(), columnas] = bloque.loc[existentes, columnas].to_numpy()
+            nuevos = bloque[~existentes]
+            if len(nuevos):
+                indice = range(self._siguiente, self._siguiente + len(nuevos))
+                self._siguiente += len(nuevos)
+                filas = nuevos[columnas].reindex(columns=df.columns, fill_value="").set_axis(indice)
+                self._df = pd.concat([df, filas])
+                self._indice.update(zip(nuevos["_clave"], indice))
+            self._buscador = None
+            self._cambio()
+            return len(bloque)
+
+    @property
+    def df(self):
+        return self.sincronizar()
+
+    def foto(self):
+        """
+        Copia de solo lectura de la versión actual; se rehace solo cuando la versión cambia.
+        El cambio de una foto a otra es una sola asignación: quien ya tiene la anterior no ve datos a medias.
+        """
+        foto = self._foto
+        if foto is not None and foto.version == self.version:
+            return foto
+        with self.lock:
+            self.sincronizar()
+            if self._foto is None or self._foto.version != self.version:
+                self._foto = FotoInventario(self._df.copy(), self._indice, self.version,
+                                            f"{self.epoca}-{self.version}")
+            return self._foto
+
+    def consultar(self, **consulta):
+        return self.foto().consultar(**consulta)
+
+    def guardar(self):
+        """
+        Los cambios ya están en el diario (y ya avisaron con _cambio); solo se programa
+        el volcado al Excel.
+        """
+        with self.lock:
+            self._programar_compactacion()
+
+    # -------- volcado del diario al Excel --------
+    def _programar_compactacion(self):
+        # Se llama con self.lock tomado: como mucho un hilo de compactación a la vez
+        if self._compactando:
+            return
+        if self.diario.pendientes >= MAX_MOVIMIENTOS_DIARIO:
+            self._compactando = True
+            threading.Thread(target=self._compactar_seguro, daemon=True).start()
+        elif self._temporizador is None:
+            self._temporizador = threading.Timer(INTERVALO_COMPACTACION, self._compactar_seguro)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+    def _compactar_seguro(self):
+        # Desde un hilo: si falla (p. ej. el Excel abierto en Windows) el diario se conserva y se reintenta
+        try:
+            self.compactar()
+        except Exception as e:
+            print(f"No se pudo volcar el inventario a {self.ruta.name}: {e}")
+        finally:
+            with self.lock:
+                self._compactando = False
+
+    def compactar(self, completo=False):
+        # completo=True reescribe todo el inventario (después de importar_bloque, que no usa diario)
+        with self._lock_compactar:
+            with self.lock:
+                self._temporizador = None
+                if self._df is None or not (completo or self.diario.ruta.exists() or self.diario.ruta_rotada.exists()):
+                    return
+                self.diario.rotar()
+                movimientos = self.diario.leer(solo_rotado=True)
+                foto = self._df.copy()
+                self._escribiendo = True
+            # La escritura (lenta en Excel) se hace sin bloquear a las pestañas
+            try:
+                if completo:
+                    save_df(self.ruta, foto)
+                else:
+                    ALMACEN.volcar_movimientos(self.ruta, movimientos, foto)
+            except Exception:
+                with self.lock:
+                    self._escribiendo = False
+                raise
+            with self.lock:
+                self._mtime = self._mtime_archivo()
+                self._escribiendo = False
+                self.diario.descartar_rotado()
+
+_INVENTARIO_POR_DEFECTO = None
+def inventario_de(controller=None):
+    # Las pestañas usan el inventario del controlador; si no hay, uno compartido del proceso
+    global _INVENTARIO_POR_DEFECTO
+    if controller is not None and hasattr(controller, "inventario"):
+        return controller.inventario
+    if _INVENTARIO_POR_DEFECTO is None:
+        _INVENTARIO_POR_DEFECTO = InventarioStore(ARCHIVO_INVENTARIO)
+    return _INVENTARIO_POR_DEFECTO
+# --------------------
+# IMPORTACIÓN POR BLOQUES
+# --------------------
+def leer_excel_por_bloques(ruta, tam_bloque=TAM_BLOQUE_IMPORTACION):
+    """
+    Lee la primera hoja fila por fila (openpyxl read_only) y entrega (DataFrame, filas_leidas, total).
+    Nunca tiene en memoria más de un bloque del archivo. Los .xls se leen completos con pandas.
+    """
+    if Path(ruta).suffix.lower() == ".xls":
+        df = pd.read_excel(ruta, dtype=object)
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        for inicio in range(0, len(df), tam_bloque):
+            yield df.iloc[inicio:inicio + tam_bloque], min(inicio + tam_bloque, len(df)), len(df)
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [str(c).strip().lower() if c is not None else f"columna_{i}" for i, c in enumerate(encabezado)]
+        n = len(columnas)
+        total = max((ws.max_row or 1) - 1, 0)
+        bloque, leidas = [], 0
+        for fila in filas:
+            bloque.append(tuple(fila[:n]) + (None,) * (n - len(fila)))
+            if len(bloque) >= tam_bloque:
+                leidas += len(bloque)
+                yield pd.DataFrame(bloque, columns=columnas), leidas, max(total, leidas)
+                bloque = []
+        if bloque:
+            leidas += len(bloque)
+            yield pd.DataFrame(bloque, columns=columnas), leidas, max(total, leidas)
+    finally:
+        wb.close()
+
+def validar_bloque_inventario(bloque):
+    """
+    Deja solo las filas con código y con stock/precio numéricos (vacío cuenta como 0).
+    Devuelve (filas válidas, número de filas rechazadas).
+    """
+    bloque = bloque.loc[:, [not str(c).startswith("columna_") for c in bloque.columns]]
+    if "codigo" not in bloque.columns:
+        raise ValueError("El archivo no tiene columna 'codigo'")
+    bloque = bloque.astype(object).where(bloque.notna(), "")
+    bloque["codigo"] = bloque["codigo"].astype(str).str.strip()
+    valido = (bloque["codigo"] != "").to_numpy()
+    for col, tipo in (("stock", int), ("precio", float)):
+        if col in bloque.columns:
+            texto = bloque[col].astype(str).str.strip()
+            numero = pd.to_numeric(texto.where(texto != "", "0"), errors="coerce")
+            valido &= numero.notna().to_numpy()
+            bloque[col] = numero.fillna(0).astype(tipo)
+    for col in bloque.columns:
+        if col not in ("codigo", "stock", "precio"):
+            bloque[col] = bloque[col].astype(str)
+    return bloque[valido], int((~valido).sum())
+
+def importar_inventario_excel(inventario, ruta, al_avanzar=None, tam_bloque=TAM_BLOQUE_IMPORTACION, cancelado=None):
+    """
+    Importa un Excel de proveedor por bloques (pensado para un hilo aparte).
+    al_avanzar(filas_leidas, total) se llama después de cada bloque. Si cancelado() devuelve True
+    se deja de leer y se guarda lo importado hasta ahí. Devuelve (importadas, rechazadas).
+    """
+    importadas = rechazadas = 0
+    for bloque, leidas, total in leer_excel_por_bloques(ruta, tam_bloque):
+        if cancelado is not None and cancelado():
+            break
+        validas, malas = validar_bloque_inventario(bloque)
+        rechazadas += malas
+        if len(validas):
+            importadas += inventario.importar_bloque(validas)
+        if al_avanzar:
+            al_avanzar(leidas, total)
+    inventario.compactar(completo=True)
+    return importadas, rechazadas
+
+def serializar_json(datos):
+    # Un solo serializador para /inventario: la misma versión da siempre los mismos bytes
+    return json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8")
+
+def json_inventario_completo(foto):
+    # Lista completa, en el orden del archivo
+    return serializar_json(foto.df.to_dict(orient="records"))
+
+class PublicadorInventario:
+    """
+    Mantiene el inventario completo ya convertido a JSON (y comprimido con gzip) para GET /inventario.
+    Un hilo rehace los bytes después de cada cambio; varios cambios seguidos se publican una sola vez.
+    """
+    ESPERA_AGRUPAR = 0.2  # segundos para juntar cambios seguidos (p. ej. una venta de varias piezas)
+
+    def __init__(self, inventario):
+        self.inventario = inventario
+        self.actual = None   # (version, etag, json, json_gzip); se reemplaza completo, nunca se modifica
+        self._cond = threading.Condition()
+        self._version = None
+        inventario.suscribir(self._avisar)
+
+    def _avisar(self, version):
+        with self._cond:
+            self._version = version
+            self._cond.notify()
+
+    def iniciar(self):
+        self._version = self.inventario.version
+        threading.Thread(target=self._bucle, daemon=True).start()
+        return self
+
+    def publicar(self):
+        foto = self.inventario.foto()
+        if self.actual is not None and self.actual[1] == foto.etag:
+            return
+        cuerpo = json_inventario_completo(foto)
+        self.actual = (foto.version, foto.etag, cuerpo, gzip.compress(cuerpo, compresslevel=6))
+
+    def vigente(self):
+        # Los bytes publicados solo si son de la versión actual; mientras el hilo los rehace
+        # (o si dejó de publicar) hay que responder desde la foto
+        actual = self.actual
+        if actual is not None and actual[0] == self.inventario.version:
+            return actual
+        return None
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while self._version is None:
+                    self._cond.wait()
+            time.sleep(self.ESPERA_AGRUPAR)
+            with self._cond:
+                self._version = None
+            try:
+                self.publicar()
+            except Exception as e:
+                print(f"No se pudo publicar el inventario: {e}")
+
+# --------------------
+# SINCRONIZACIÓN CON RENDER
+# --------------------
+URL_RENDER = "https://jq-motors-inventarios.onrender.com/inventario"
+ARCHIVO_PENDIENTES_RENDER = CARPETA_DATOS / "render_pendientes.json"
+ARCHIVO_RECHAZADOS_RENDER = CARPETA_DATOS / "render_rechazados.jsonl"
+ESPERA_MAXIMA_RENDER = 300  # segundos entre reintentos, como máximo
+LOTE_RENDER = 100  # artículos por envío (un POST a /inventario/bulk)
+def articulo_render(row):
+    # Texto, igual que en el inventario (read_excel(dtype=str)): todos los envíos con los mismos tipos
+    return {
+        "codigo": _texto_excel(row['codigo']),
+        "descripcion": _texto_excel(row.get('descripcion','')),
+        "ubicacion": _texto_excel(row.get('ubicacion','')),
+        "stock": _texto_excel(row.get('stock',0)),
+        "precio": _texto_excel(row.get('precio',0))
+    }
+def _rechazado_render(error):
+    # 4xx: el servidor no acepta el artículo y reenviarlo daría lo mismo.
+    # 404 (ruta que falta), 408 y 429 sí se reintentan
+    return (isinstance(error, urllib.error.HTTPError) and 400 <= error.code < 500
+            and error.code not in (404, 408, 429))
+class SincronizadorRender:
+    """
+    Envía a Render los artículos modificados desde un hilo aparte, sin frenar la caja.
+    La cola vive en disco (render_pendientes.json) y agrupa por código: solo viaja la última versión.
+    Si falla el envío se reintenta con espera creciente; un artículo que el servidor rechaza (4xx)
+    sale de la cola y queda en render_rechazados.jsonl.
+    """
+    def __init__(self, url=URL_RENDER, ruta=ARCHIVO_PENDIENTES_RENDER, lote=LOTE_RENDER,
+                 ruta_rechazados=ARCHIVO_RECHAZADOS_RENDER):
+        self.url = url
+        self.ruta = Path(ruta)
+        self.lote = lote
+        self.rechazados = DiarioJSONL(ruta_rechazados)
+        self._cond = threading.Condition()
+        self._pendientes = self._leer()   # codigo -> articulo
+        self._intentos = 0
+        self._hilo = None
+        self._bulk = True   # se apaga si el servidor no tiene /inventario/bulk
+
+    def _leer(self):
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar(self):
+        tmp = self.ruta.with_name(self.ruta.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._pendientes, f, ensure_ascii=False, default=str)
+        os.replace(tmp, self.ruta)
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+        return self
+
+    def encolar(self, articulo):
+        self.encolar_lote([articulo])
+
+    def encolar_lote(self, articulos):
+        # Una sola escritura de render_pendientes.json para todo el lote (p. ej. una venta)
+        if not articulos:
+            return
+        with self._cond:
+            for articulo in articulos:
+                self._pendientes[str(articulo["codigo"])] = dict(articulo)
+            self._guardar()
+            self._cond.notify()
+
+    def _enviar(self, articulo, url=None):
+        datos = json.dumps(articulo, ensure_ascii=False, default=str).encode("utf-8")
+        req = urllib.request.Request(url or self.url, data=datos, method="POST",
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=30):
+            pass  # urlopen lanza HTTPError si la respuesta no es 2xx
+
+    def _enviar_lote(self, lote, enviados, rechazados):
+        # Un solo POST a /bulk; si el servidor aún no lo tiene (404), uno por uno
+        if self._bulk:
+            try:
+                self._enviar(list(lote.values()), self.url + "/bulk")
+                enviados.extend(lote)
+                return
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    self._bulk = False
+                elif not _rechazado_render(e):
+                    raise
+                # Un artículo malo hace rechazar todo el lote: uno por uno se aparta solo ese
+        # enviados y rechazados se van llenando: si falla a la mitad, lo ya resuelto sale de la cola
+        for codigo, articulo in lote.items():
+            try:
+                self._enviar(articulo)
+            except urllib.error.HTTPError as e:
+                if not _rechazado_render(e):
+                    raise
+                rechazados.append((codigo, e))
+            else:
+                enviados.append(codigo)
+
+    def _apartar(self, lote, rechazados):
+        registros = []
+        for codigo, error in rechazados:
+            try:
+                mensaje = error.read().decode("utf-8", "replace")
+            except Exception:
+                mensaje = ""
+            registros.append({"fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "codigo": codigo,
+                              "estado": error.code, "mensaje": mensaje, "articulo": lote[codigo]})
+        self.rechazados.anexar_lote(registros)
+        print(f"Render rechazó {len(registros)} artículo(s); quedan en {self.rechazados.ruta.name}")
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    self._cond.wait()
+                lote = dict(list(self._pendientes.items())[:self.lote])
+            enviados, rechazados, error = [], [], None
+            try:
+                self._enviar_lote(lote, enviados, rechazados)
+            except Exception as e:
+                error = e
+            if rechazados:
+                try:
+                    self._apartar(lote, rechazados)
+                except Exception as e:
+                    # Sin poder apartarlos no se pierden: siguen en la cola
+                    print(f"No se pudieron guardar los rechazados de Render: {e}")
+                    rechazados = []
+            with self._cond:
+                for codigo in enviados + [codigo for codigo, _ in rechazados]:
+                    # Si el artículo cambió mientras se enviaba, se queda en la cola
+                    if self._pendientes.get(codigo) is lote[codigo]:
+                        del self._pendientes[codigo]
+                if enviados or rechazados:
+                    self._guardar()
+                if enviados:
+                    print(f"Sincronizado con Render: {len(enviados)} artículo(s)")
+            if error is None:
+                self._intentos = 0
+            else:
+                self._intentos += 1
+                espera = min(ESPERA_MAXIMA_RENDER, 2 ** self._intentos)
+                print(f"No se pudo enviar a Render ({error}); reintento en {espera} s")
+                time.sleep(espera)
+
+_SINCRONIZADOR_POR_DEFECTO = None
+def sincronizador_de(controller=None):
+    global _SINCRONIZADOR_POR_DEFECTO
+    if controller is not None and hasattr(controller, "sincronizador"):
+        return controller.sincronizador
+    if _SINCRONIZADOR_POR_DEFECTO is None:
+        _SINCRONIZADOR_POR_DEFECTO = SincronizadorRender().iniciar()
+    return _SINCRONIZADOR_POR_DEFECTO
+# --------------------
+# TAREAS EN SEGUNDO PLANO
+# --------------------
+class TareaCancelada(Exception):
+    pass
+
+class Tarea:
+    """
+    Un trabajo enviado a EjecutorTareas. El trabajo recibe su Tarea como primer argumento
+    para avisar el avance (avanzar) y revisar si se pidió cancelar (cancelada / revisar).
+    """
+    def __init__(self, ejecutor, al_terminar, al_fallar, al_avanzar):
+        self._ejecutor = ejecutor
+        self._cancelar = threading.Event()
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_avanzar = al_avanzar
+        self.futuro = None
+
+    def cancelar(self):
+        self._cancelar.set()
+        if self.futuro is not None:
+            self.futuro.cancel()  # si aún no empezó, ya no empieza
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    def revisar(self):
+        # Para llamar entre pasos largos: corta el trabajo si el usuario canceló
+        if self.cancelada:
+            raise TareaCancelada()
+
+    def avanzar(self, valor, texto=""):
+        self._ejecutor._avisos.put(("avance", self, (valor, texto)))
+
+class EjecutorTareas:
+    """
+    Hilos para guardar archivos y crear PDFs sin congelar la ventana.
+    Los callbacks (al_terminar, al_fallar, al_avanzar) siempre corren en el hilo de Tk:
+    los avisos viajan por una cola que se revisa con after().
+    recurso: los trabajos con el mismo recurso (p. ej. la ruta del archivo) se ejecutan de a uno.
+    """
+    def __init__(self, raiz, hilos=4, intervalo=50):
+        self.raiz = raiz
+        self.intervalo = intervalo
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="tarea")
+        self._avisos = queue.Queue()
+        self._candados = {}
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._revisando = False
+
+    def _candado(self, recurso):
+        with self._lock:
+            return self._candados.setdefault(str(recurso), threading.Lock())
+
+    def enviar(self, trabajo, *args, recurso=None, al_terminar=None, al_fallar=None, al_avanzar=None):
+        tarea = Tarea(self, al_terminar, al_fallar, al_avanzar)
+        def correr():
+            tarea.revisar()
+            if recurso is None:
+                return trabajo(tarea, *args)
+            with self._candado(recurso):
+                tarea.revisar()
+                return trabajo(tarea, *args)
+        self._pendientes += 1
+        tarea.futuro = self._pool.submit(correr)
+        tarea.futuro.add_done_callback(lambda futuro: self._avisos.put(("fin", tarea, futuro)))
+        if not self._revisando:
+            self._revisando = True
+            self.raiz.after(self.intervalo, self._revisar)
+        return tarea
+
+    def _revisar(self):
+        while True:
+            try:
+                tipo, tarea, dato = self._avisos.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if tipo == "avance":
+                    if tarea.al_avanzar is not None and not tarea.cancelada:
+                        tarea.al_avanzar(*dato)
+                    continue
+                self._pendientes -= 1
+                if dato.cancelled():
+                    error = TareaCancelada()
+                else:
+                    error = dato.exception()
+                if error is None:
+                    if tarea.al_terminar is not None:
+                        tarea.al_terminar(dato.result())
+                elif tarea.al_fallar is not None:
+                    tarea.al_fallar(error)
+                elif not isinstance(error, TareaCancelada):
+                    messagebox.showerror("Error", str(error))
+            except Exception as e:
+                print(f"Error en un aviso de tarea: {e}")
+        if self._pendientes > 0 or not self._avisos.empty():
+            self.raiz.after(self.intervalo, self._revisar)
+        else:
+            self._revisando = False
+
+    def cerrar(self):
+        # Al salir: esperar a que terminen las escrituras en curso
+        self._pool.shutdown(wait=True, cancel_futures=False)
+
+_EJECUTOR_POR_DEFECTO = None
+def ejecutor_de(controller=None, widget=None):
+    global _EJECUTOR_POR_DEFECTO
+    if controller is not None and hasattr(controller, "ejecutor"):
+        return controller.ejecutor
+    if _EJECUTOR_POR_DEFECTO is None:
+        _EJECUTOR_POR_DEFECTO = EjecutorTareas(widget.winfo_toplevel())
+    return _EJECUTOR_POR_DEFECTO
+
+# --------------------
+# REPORTES PDF
+# --------------------
+EMPRESA = "JQ MOTORS"
+EXTENSIONES_LOGO = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+COLUMNAS_REPORTE = ["Código", "Descripción", "Cant.", "Precio", "Total"]
+ANCHOS_REPORTE = (0.16, 0.46, 0.10, 0.14, 0.14)  # fracción del ancho útil por columna
+
+def _dinero(valor):
+    try:
+        return f"{float(str(valor).replace(',', '')):,.2f}"
+    except ValueError:
+        return str(valor)
+
+def seccion_cotizacion(productos, total_general, titulo="COTIZACIÓN"):
+    # productos: renglones de ModeloCotizacion (Código, Descripción, Precio, Cantidad, Total, ...)
+    filas = [(p[0], p[1], p[3], _dinero(p[2]), _dinero(p[4])) for p in productos]
+    return {"titulo": titulo, "columnas": COLUMNAS_REPORTE, "filas": filas, "total": _dinero(total_general)}
+
+def seccion_taller(moto, insumos):
+    # insumos: registros de MotoTaller
+    filas = [(i["codigo"], i["descripcion"], f'{i["cantidad"]:g}', _dinero(i["precio"]), _dinero(i["total"]))
+             for i in insumos]
+    return {"titulo": f"Taller - {moto}", "columnas": COLUMNAS_REPORTE, "filas": filas,
+            "total": _dinero(sum(i["total"] for i in insumos))}
+
+class MotorReportes:
+    """
+    Tickets y reportes de taller con reportlab. Estilos, estilo de tabla y logo se preparan una sola vez.
+    En cada PDF el encabezado (logo de LOGO_DIR + empresa) se dibuja una vez como form XObject y cada
+    página solo lo referencia. Las tablas se parten solas entre páginas repitiendo la fila de títulos.
+    Una sección = {"titulo", "columnas", "filas", "total"}; cada sección empieza en página nueva.
+    """
+    MARGEN = 36
+    ALTO_ENCABEZADO = 50
+
+    def __init__(self, empresa=EMPRESA, carpeta_logo=LOGO_DIR):
+        self.empresa = empresa
+        self.carpeta_logo = Path(carpeta_logo)
+        self._lock = threading.Lock()
+        self._listo = False
+
+    def _preparar(self):
+        with self._lock:
+            if self._listo:
+                return
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import letter
+            from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+            from reportlab.lib.utils import ImageReader
+            from reportlab.platypus import TableStyle
+            estilos = getSampleStyleSheet()
+            self.tam_pagina = letter
+            self.estilo_titulo = estilos["Heading2"]
+            self.estilo_celda = ParagraphStyle("celda", parent=estilos["BodyText"], fontSize=8, leading=10)
+            self.estilo_tabla = TableStyle([
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#003366")),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, -1), 8),
+                ("ALIGN", (2, 1), (-1, -1), "RIGHT"),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#eef3f8")]),
+            ])
+            self.estilo_total = TableStyle([("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+                                            ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#dde6ef"))])
+            self.logo = None
+            if self.carpeta_logo.exists():
+                for ruta in sorted(self.carpeta_logo.iterdir()):
+                    if ruta.suffix.lower() in EXTENSIONES_LOGO:
+                        try:
+                            self.logo = ImageReader(str(ruta))  # se decodifica una vez por sesión
+                            break
+                        except Exception:
+                            continue
+            self._listo = True
+
+    def _encabezado(self, canvas, doc):
+        ancho, alto = self.tam_pagina
+        if not canvas.hasForm("encabezado"):
+            # Se dibuja en la primera página; las demás solo lo referencian
+            base = alto - self.MARGEN - self.ALTO_ENCABEZADO
+            x = self.MARGEN
+            canvas.beginForm("encabezado")
+            if self.logo is not None:
+                canvas.drawImage(self.logo, x, base, width=self.ALTO_ENCABEZADO * 2, height=self.ALTO_ENCABEZADO,
+                                 preserveAspectRatio=True, anchor="sw", mask="auto")
+                x += self.ALTO_ENCABEZADO * 2 + 10
+            canvas.setFont("Helvetica-Bold", 16)
+            canvas.drawString(x, base + 28, self.empresa)
+            canvas.setFont("Helvetica", 9)
+            canvas.drawString(x, base + 12, datetime.now().strftime("%d/%m/%Y %H:%M"))
+            canvas.line(self.MARGEN, base - 6, ancho - self.MARGEN, base - 6)
+            canvas.endForm()
+        canvas.doForm("encabezado")
+        canvas.setFont("Helvetica", 8)
+        canvas.drawRightString(ancho - self.MARGEN, self.MARGEN / 2, f"Página {doc.page}")
+
+    def _historia(self, secciones, ancho_util):
+        from xml.sax.saxutils import escape
+        from reportlab.platypus import PageBreak, Paragraph, Table
+        historia = []
+        for n, sec in enumerate(secciones):
+            if n:
+                historia.append(PageBreak())
+            historia.append(Paragraph(escape(sec["titulo"]), self.estilo_titulo))
+            filas = [list(sec["columnas"])]
+            # La descripción (2a columna) se parte en renglones si no cabe
+            filas += [[str(v) if i != 1 else Paragraph(escape(str(v)), self.estilo_celda) for i, v in enumerate(fila)]
+                      for fila in sec["filas"]]
+            con_total = sec.get("total") is not None
+            if con_total:
+                filas.append([""] * (len(sec["columnas"]) - 2) + ["TOTAL", str(sec["total"])])
+            anchos = [f * ancho_util for f in ANCHOS_REPORTE] if len(sec["columnas"]) == len(ANCHOS_REPORTE) else None
+            tabla = Table(filas, colWidths=anchos, repeatRows=1)
+            tabla.setStyle(self.estilo_tabla)
+            if con_total:
+                tabla.setStyle(self.estilo_total)
+            historia.append(tabla)
+        return historia
+
+    def generar(self, archivo, secciones):
+        """Un PDF con todas las secciones (p. ej. las cotizaciones del día). Devuelve la ruta."""
+        self._preparar()
+        from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate
+        doc = BaseDocTemplate(str(archivo), pagesize=self.tam_pagina, title=self.empresa,
+                              leftMargin=self.MARGEN, rightMargin=self.MARGEN, bottomMargin=self.MARGEN,
+                              topMargin=self.MARGEN + self.ALTO_ENCABEZADO + 16)
+        marco = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id="cuerpo")
+        doc.addPageTemplates([PageTemplate(id="pagina", frames=[marco], onPage=self._encabezado)])
+        doc.build(self._historia(secciones, doc.width))
+        return archivo
+
+    def generar_lote(self, trabajos):
+        """Varios PDFs en una llamada: trabajos = [(archivo, secciones)]. Devuelve las rutas."""
+        return [self.generar(archivo, secciones) for archivo, secciones in trabajos]
+
+_MOTOR_REPORTES = None
+def motor_reportes():
+    global _MOTOR_REPORTES
+    if _MOTOR_REPORTES is None:
+        _MOTOR_REPORTES = MotorReportes()
+    return _MOTOR_REPORTES
+
 def habilitar_copia_treeview(tree):
     def copiar(event):
         seleccion = tree.selection()
@@ -74,6 +1670,205 @@ def habilitar_copia_treeview(tree):
         tree.clipboard_clear()
         tree.clipboard_append(texto)
     tree.bind("<Control-c>", copiar)
+ESPERA_AUTOCOMPLETAR = 150  # ms sin teclear antes de buscar
+class ListaSugerencias:
+    """
+    Lista desplegable bajo un Entry con los códigos que coinciden con lo escrito.
+    buscar(texto) devuelve [(codigo, descripcion)]; al_elegir(codigo) se llama al seleccionar uno.
+    espera: ms sin teclear antes de buscar (0 = buscar en cada tecla).
+    """
+    TECLAS_IGNORADAS = {"Up", "Down", "Return", "Escape", "Tab", "Shift_L", "Shift_R", "Control_L", "Control_R"}
+
+    def __init__(self, entry, buscar, al_elegir=None, limite=8, espera=0):
+        self.entry = entry
+        self.buscar = buscar
+        self.al_elegir = al_elegir
+        self.limite = limite
+        self.espera = espera
+        self._programada = None
+        self.codigos = []
+        self.lista = tk.Listbox(entry.winfo_toplevel(), height=limite, activestyle="dotbox")
+        self.lista.bind("<Double-Button-1>", self.elegir)
+        self.lista.bind("<Return>", self.elegir)
+        self.lista.bind("<Escape>", lambda e: self.ocultar())
+        entry.bind("<KeyRelease>", self.actualizar, add="+")
+        entry.bind("<Down>", self.enfocar_lista, add="+")
+        entry.bind("<Escape>", lambda e: self.ocultar(), add="+")
+        entry.bind("<FocusOut>", lambda e: entry.after(150, self._ocultar_si_sin_foco), add="+")
+
+    def actualizar(self, event=None):
+        if event is not None and event.keysym in self.TECLAS_IGNORADAS:
+            return
+        if self.espera:
+            # Solo se busca cuando el usuario deja de teclear
+            if self._programada is not None:
+                self.entry.after_cancel(self._programada)
+            self._programada = self.entry.after(self.espera, self._buscar_ahora)
+        else:
+            self._buscar_ahora()
+
+    def _buscar_ahora(self):
+        self._programada = None
+        texto = self.entry.get().strip()
+        resultados = self.buscar(texto, self.limite) if texto else []
+        self.mostrar(resultados)
+
+    def mostrar(self, resultados):
+        self.codigos = [str(c) for c, _ in resultados]
+        self.lista.delete(0, tk.END)
+        if not resultados:
+            self.ocultar()
+            return
+        for codigo, desc in resultados:
+            self.lista.insert(tk.END, f"{codigo} - {desc}")
+        self.lista.configure(height=min(len(resultados), self.limite))
+        self.lista.place(in_=self.entry, x=0, rely=1.0, relwidth=3.0)
+        self.lista.lift()
+
+    def ocultar(self):
+        self.lista.place_forget()
+
+    def _ocultar_si_sin_foco(self):
+        if self.entry.focus_get() is not self.lista:
+            self.ocultar()
+
+    def enfocar_lista(self, event=None):
+        if self.codigos:
+            self.lista.focus_set()
+            self.lista.selection_clear(0, tk.END)
+            self.lista.selection_set(0)
+            self.lista.activate(0)
+        return "break"
+
+    def elegir(self, event=None):
+        sel = self.lista.curselection()
+        if not sel:
+            return
+        codigo = self.codigos[sel[0]]
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, codigo)
+        self.ocultar()
+        self.entry.focus_set()
+        if self.al_elegir:
+            self.al_elegir(codigo)
+class TreeviewVirtual:
+    """
+    Muestra muchas filas en un Treeview creando solo los renglones visibles.
+    Cada fila se identifica por su clave (código normalizado): actualizar_fila() y quitar()
+    tocan solo esas filas, y al repintar solo se reescriben los renglones que cambiaron.
+    """
+    def __init__(self, tree, scrollbar=None, clave=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.clave = clave or (lambda valores: normalizar_codigo(valores[0]))
+        self.filas = []        # tuplas de valores
+        self._claves = []      # clave de cada fila, en el mismo orden
+        self.posiciones = {}   # clave -> posición en filas
+        self.inicio = 0
+        self._mostrado = []    # valores pintados en cada renglón visible
+        self._seleccion = set()
+        if scrollbar is not None:
+            scrollbar.configure(command=self.yview)
+        tree.bind("<Configure>", lambda e: self.pintar(), add="+")
+        tree.bind("<MouseWheel>", self._rueda, add="+")
+        tree.bind("<Button-4>", lambda e: self.desplazar(-3), add="+")
+        tree.bind("<Button-5>", lambda e: self.desplazar(3), add="+")
+        tree.bind("<<TreeviewSelect>>", self._al_seleccionar, add="+")
+
+    # -------- datos --------
+    def cargar(self, filas, conservar_posicion=False):
+        self.filas = [tuple(f) for f in filas]
+        self._claves = [self.clave(f) for f in self.filas]
+        self.posiciones = {c: i for i, c in enumerate(self._claves)}
+        if not conservar_posicion:
+            self.inicio = 0
+        self.pintar()
+
+    def actualizar_fila(self, valores):
+        valores = tuple(valores)
+        clave = self.clave(valores)
+        i = self.posiciones.get(clave)
+        if i is None:
+            i = len(self.filas)
+            self.posiciones[clave] = i
+            self.filas.append(valores)
+            self._claves.append(clave)
+        else:
+            self.filas[i] = valores
+        self.pintar()
+
+    def quitar(self, claves):
+        # Todas las filas con esas claves (un código repetido en el archivo tiene varias)
+        claves = set(claves)
+        if not any(c in self.posiciones for c in claves):
+            return
+        conservar = [i for i, c in enumerate(self._claves) if c not in claves]
+        self.filas = [self.filas[i] for i in conservar]
+        self._claves = [self._claves[i] for i in conservar]
+        self.posiciones = {c: i for i, c in enumerate(self._claves)}
+        self._seleccion.difference_update(claves)
+        self.pintar()
+
+    def seleccion(self):
+        # Claves seleccionadas, aunque ya no estén en pantalla
+        return [c for c in self._seleccion if c in self.posiciones]
+
+    # -------- pintado --------
+    def _visibles(self):
+        hijos = self.tree.get_children()
+        caja = self.tree.bbox(hijos[0]) if hijos else None
+        alto = self.tree.winfo_height()
+        if alto <= 1 or not caja:
+            return int(self.tree.cget("height"))
+        return max(1, (alto - caja[1]) // max(caja[3], 1))
+
+    def pintar(self):
+        n = self._visibles()
+        self.inicio = max(0, min(self.inicio, len(self.filas) - n))
+        ventana = self.filas[self.inicio:self.inicio + n]
+        hijos = list(self.tree.get_children())
+        while len(hijos) < len(ventana):
+            hijos.append(self.tree.insert("", "end", iid=f"renglon{len(hijos)}"))
+            self._mostrado.append(None)
+        if len(hijos) > len(ventana):
+            self.tree.delete(*hijos[len(ventana):])
+            del hijos[len(ventana):]
+            del self._mostrado[len(ventana):]
+        seleccionar = []
+        for i, (iid, valores) in enumerate(zip(hijos, ventana)):
+            if self._mostrado[i] != valores:
+                self.tree.item(iid, values=valores)
+                self._mostrado[i] = valores
+            if self._claves[self.inicio + i] in self._seleccion:
+                seleccionar.append(iid)
+        self.tree.selection_set(seleccionar)
+        if self.scrollbar is not None:
+            total = len(self.filas)
+            if total:
+                self.scrollbar.set(self.inicio / total, min(1.0, (self.inicio + n) / total))
+            else:
+                self.scrollbar.set(0, 1)
+
+    def _al_seleccionar(self, event=None):
+        visibles = set(self._claves[self.inicio:self.inicio + len(self._mostrado)])
+        elegidas = {self._claves[self.inicio + self.tree.index(iid)] for iid in self.tree.selection()}
+        self._seleccion = (self._seleccion - visibles) | elegidas
+
+    # -------- desplazamiento --------
+    def desplazar(self, renglones):
+        self.inicio += renglones
+        self.pintar()
+
+    def _rueda(self, event):
+        self.desplazar(-3 if event.delta > 0 else 3)
+
+    def yview(self, *args):
+        n = self._visibles()
+        if args and args[0] == "moveto":
+            self.inicio = int(float(args[1]) * len(self.filas))
+        elif args and args[0] == "scroll":
+            self.inicio += int(args[1]) * (n if args[2] == "pages" else 1)
+        self.pintar()
 def resource_path(relative_path):
     try:
         base_path = sys._MEIPASS
@@ -124,6 +1919,8 @@ class Stock(ttk.Frame):
     def __init__(self, parent, controller=None):
         super().__init__(parent)
         self.controller = controller
+        self.inventario = inventario_de(controller)
+        self.repetidos_avisados = []  # códigos repetidos ya avisados (no repetir el aviso)
         ttk.Label(self, text='STOCK', font=('Segoe UI', 12, 'bold')).pack(anchor='w', padx=6, pady=6)
 
         # ------------------- BUSCAR POR CÓDIGO -------------------
@@ -145,7 +1942,14 @@ class Stock(ttk.Frame):
         # ------------------- BOTONES ARRIBA A LA DERECHA -------------------
         frame_top_btns = ttk.Frame(self)
         frame_top_btns.pack(fill='x', padx=6)
-        ttk.Button(frame_top_btns, text='Importar', command=self.importar_inventario).pack(side='right', padx=4)
+        self.btn_importar = ttk.Button(frame_top_btns, text='Importar', command=self.importar_inventario)
+        self.btn_importar.pack(side='right', padx=4)
+        self.btn_cancelar = ttk.Button(frame_top_btns, text='Cancelar', command=self.cancelar_importacion)
+        self.tarea_importar = None
+        # Progreso de la importación (solo visible mientras corre)
+        self.progreso_importar = ttk.Progressbar(frame_top_btns, length=220, maximum=100)
+        self.progreso_texto = tk.StringVar(value="")
+        ttk.Label(frame_top_btns, textvariable=self.progreso_texto).pack(side='right', padx=4)
 
         # ------------------- AGREGAR / DESCONTAR -------------------
         frame_desc = ttk.LabelFrame(self, text="AGREGAR / DESCONTAR")
@@ -182,11 +1986,17 @@ class Stock(ttk.Frame):
 
         # ------------------- TREEVIEW PRINCIPAL -------------------
         cols = ["codigo", "descripcion", "ubicacion", "stock", "precio", "libres", "en_taller", "nuevas_entradas"]
-        self.tree = ttk.Treeview(self, columns=cols, show='headings', height=14)
+        frame_tabla = ttk.Frame(self)
+        frame_tabla.pack(fill='both', expand=True, padx=6, pady=6)
+        self.tree = ttk.Treeview(frame_tabla, columns=cols, show='headings', height=14)
         for c in cols:
             self.tree.heading(c, text=c.capitalize())
             self.tree.column(c, width=120, anchor='center')
-        self.tree.pack(fill='both', expand=True, padx=6, pady=6)
+        barra = ttk.Scrollbar(frame_tabla, orient='vertical')
+        barra.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+        # Solo se crean los renglones visibles; las filas viven en self.tabla
+        self.tabla = TreeviewVirtual(self.tree, barra)
         self.cargar_datos()
 
     # --------------------------------------------------------
@@ -195,19 +2005,54 @@ class Stock(ttk.Frame):
     def importar_inventario(self):
         archivo = filedialog.askopenfilename(title='Seleccionar Excel', filetypes=[('Excel','*.xlsx;*.xls')])
         if not archivo: return
-        try:
-            df_new = pd.read_excel(archivo, engine='openpyxl', dtype=str).fillna('')
-            if self.controller:
-                self.controller.inventario_df = pd.concat(
-                    [self.controller.inventario_df, df_new], ignore_index=True
-                )
-                if 'codigo' in self.controller.inventario_df.columns:
-                    self.controller.inventario_df.drop_duplicates(subset=['codigo'], keep='last', inplace=True)
-            save_df(ARCHIVO_INVENTARIO, self.controller.inventario_df)
-            self.cargar_datos()
-            messagebox.showinfo('Éxito','Inventario importado')
-        except Exception as e:
-            messagebox.showerror('Error', str(e))
+        def trabajo(tarea):
+            resultado = importar_inventario_excel(
+                self.inventario, archivo, al_avanzar=tarea.avanzar, cancelado=lambda: tarea.cancelada)
+            return resultado + (tarea.cancelada,)
+        self.btn_importar.state(['disabled'])
+        self.progreso_importar['value'] = 0
+        self.btn_cancelar.pack(side='right', padx=4)
+        self.progreso_importar.pack(side='right', padx=4)
+        self.progreso_texto.set('Importando...')
+        # La lectura y el guardado van en un hilo; la ventana solo recibe los avisos
+        self.tarea_importar = ejecutor_de(self.controller, self).enviar(
+            trabajo, recurso=ARCHIVO_INVENTARIO, al_avanzar=self._avance_importacion,
+            al_terminar=self._fin_importacion, al_fallar=self._error_importacion)
+
+    def cancelar_importacion(self):
+        if self.tarea_importar is not None:
+            self.tarea_importar.cancelar()
+            self.progreso_texto.set('Cancelando...')
+
+    def _avance_importacion(self, leidas, total):
+        self.progreso_importar['value'] = 100 * leidas / max(total, 1)
+        if leidas < total:
+            self.progreso_texto.set(f'Importando... {leidas:,} de {total:,} filas')
+        else:
+            self.progreso_texto.set('Guardando inventario...')
+
+    def _terminar_importacion(self):
+        self.tarea_importar = None
+        self.btn_importar.state(['!disabled'])
+        self.btn_cancelar.pack_forget()
+        self.progreso_importar.pack_forget()
+        self.progreso_texto.set('')
+        self.cargar_datos()
+
+    def _fin_importacion(self, resultado):
+        self._terminar_importacion()
+        importadas, rechazadas, cancelada = resultado
+        texto = f'Inventario importado: {importadas} artículo(s)'
+        if cancelada:
+            texto = f'Importación cancelada: se guardaron {importadas} artículo(s)'
+        if rechazadas:
+            texto += f'\n{rechazadas} fila(s) sin código o con stock/precio inválido no se importaron'
+        messagebox.showinfo('Éxito', texto)
+
+    def _error_importacion(self, error):
+        self._terminar_importacion()
+        if not isinstance(error, TareaCancelada):
+            messagebox.showerror('Error', str(error))
 
     # --------------------------------------------------------
     # EXPORTAR INVENTARIO
@@ -215,54 +2060,37 @@ class Stock(ttk.Frame):
     def exportar_inventario(self):
         archivo = filedialog.asksaveasfilename(title='Guardar Excel', defaultextension='.xlsx', filetypes=[('Excel','*.xlsx')])
         if not archivo: return
-        try:
-            df = load_inventario_file()
-            df.to_excel(archivo, index=False, engine='openpyxl')
-            messagebox.showinfo('Éxito','Inventario exportado')
-        except Exception as e:
-            messagebox.showerror('Error', str(e))
+        # La foto no cambia aunque se siga vendiendo mientras se escribe el archivo
+        df = self.inventario.foto().df
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: df.to_excel(archivo, index=False, engine='openpyxl'), recurso=archivo,
+            al_terminar=lambda _: messagebox.showinfo('Éxito','Inventario exportado'),
+            al_fallar=lambda e: messagebox.showerror('Error', str(e)))
 
     # --------------------------------------------------------
     # CARGAR DATOS
     # --------------------------------------------------------
     def cargar_datos(self):
-        # usar el DataFrame del controlador si existe
-        if self.controller and hasattr(self.controller, 'inventario_df'):
-            df = self.controller.inventario_df.copy()
-        else:
-            df = load_inventario_file()
-
-        if df.empty:
-            self.tree.delete(*self.tree.get_children())
-            return
+        # usar el inventario compartido en memoria
+        with self.inventario.lock:
+            filas = preparar_filas_inventario(self.inventario.df)
+            repetidos = sorted(self.inventario.repetidos)
+        self.tabla.cargar(filas, conservar_posicion=True)
+        if repetidos and repetidos != self.repetidos_avisados:
+            self.repetidos_avisados = repetidos
+            messagebox.showwarning(
+                "Códigos repetidos",
+                f"Estos códigos aparecen más de una vez en el inventario: {', '.join(repetidos[:20])}"
+                f"{'…' if len(repetidos) > 20 else ''}\nSe usa la última fila de cada uno; las demás no se borran.")
 
-        for col in ['libres','en_taller','nuevas_entradas']:
-            df[col] = df.get(col,0)
+    def valores_fila(self, r):
+        return preparar_filas_inventario(pd.DataFrame([r]))[0]
 
-        if 'codigo' in df.columns:
-            df['codigo_norm'] = df['codigo'].astype(str).apply(lambda x: quitar_acentos(x).strip().upper())
-            df.drop_duplicates(subset=['codigo_norm'], keep='last', inplace=True)
-            df.drop(columns=['codigo_norm'], inplace=True)
-
-        self.tree.delete(*self.tree.get_children())
-
-        for _, r in df.iterrows():
-            try:
-                stock = int(r.get("stock",0))
-            except:
-                stock = 0
-            libres, en_taller = obtener_estado_codigo(r.get("codigo",""), stock)
-            vals = (
-                r.get('codigo',''),
-                r.get('descripcion',''),
-                r.get('ubicacion',''),
-                stock,
-                r.get('precio',0),
-                libres,
-                en_taller,
-                r.get('nuevas_entradas',0)
-            )
-            self.tree.insert('', 'end', values=vals)
+    def refrescar_fila(self, codigo):
+        # Solo se repinta la fila que cambió, no toda la tabla
+        row = self.inventario.fila(codigo)
+        if row is not None:
+            self.tabla.actualizar_fila(self.valores_fila(row))
 
 
     # --------------------------------------------------------
@@ -273,28 +2101,13 @@ class Stock(ttk.Frame):
         if not codigo:
             messagebox.showinfo('Atención','Escribe un código para buscar')
             return
-        df = load_inventario_file()
-        if 'codigo' not in df.columns: return
-        df['codigo_clean'] = df['codigo'].astype(str).apply(lambda x: quitar_acentos(x).upper())
-        r = df[df['codigo_clean']==codigo]
-        if r.empty:
+        row = self.inventario.fila(codigo)
+        if row is None:
             messagebox.showinfo('Atención',f'Código {codigo} no encontrado')
             return
-        row = r.iloc[0]
-        try: stock = int(row.get('stock',0))
-        except: stock = 0
-        libres, en_taller = obtener_estado_codigo(row.get("codigo",""), stock)
-        self.tree.delete(*self.tree.get_children())
-        self.tree.insert('', 'end', values=(
-            row.get('codigo',''),
-            row.get('descripcion',''),
-            row.get('ubicacion',''),
-            stock,
-            row.get('precio',0),
-            libres,
-            en_taller,
-            row.get('nuevas_entradas',0)
-        ))
+        vals = self.valores_fila(row)
+        stock = vals[3]
+        self.tabla.cargar([vals])
         # rellenar formulario
         self.art_codigo.delete(0,'end'); self.art_codigo.insert(0,row.get('codigo',''))
         self.art_desc.delete(0,'end'); self.art_desc.insert(0,row.get('descripcion',''))
@@ -310,110 +2123,20 @@ class Stock(ttk.Frame):
         if not desc:
             messagebox.showinfo('Atención','Escribe descripción')
             return
-        df = load_inventario_file()
-        if 'descripcion' not in df.columns: return
-        df['desc_clean'] = df['descripcion'].astype(str).apply(lambda x: quitar_acentos(x).upper())
-        r = df[df['desc_clean'].str.contains(desc, na=False)]
-        self.tree.delete(*self.tree.get_children())
-        for _, row in r.iterrows():
-            try: stock = int(row.get('stock',0))
-            except: stock = 0
-            libres, en_taller = obtener_estado_codigo(row.get("codigo",""), stock)
-            self.tree.insert('', 'end', values=(
-                row.get('codigo',''),
-                row.get('descripcion',''),
-                row.get('ubicacion',''),
-                stock,
-                row.get('precio',0),
-                libres,
-                en_taller,
-                row.get('nuevas_entradas',0)
-            ))
-
-    # --------------------------------------------------------
-    # AGREGAR / DESCONTAR REFACCIÓN
-    # --------------------------------------------------------
-    def agregar_refaccion(self):
-        codigo = self.desc_codigo.get().strip().upper()
-        try: cantidad = int(self.desc_cantidad.get())
-        except: 
-            messagebox.showwarning("Atención","Cantidad inválida")
-            return
-        if not codigo or cantidad <= 0:
-            messagebox.showwarning("Atención","Ingrese código y cantidad válida")
-            return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'stock'] = int(df.at[idx,'stock']) + cantidad
-            save_df(ARCHIVO_INVENTARIO, df)
-            self.cargar_datos()
-            messagebox.showinfo("OK",f"Agregado {cantidad} a {codigo}")
-        else:
-            messagebox.showwarning("No encontrado","Código no encontrado")
-
-    def descontar_refaccion(self):
-        codigo = self.desc_codigo.get().strip().upper()
-        try: cantidad = int(self.desc_cantidad.get())
-        except:
-            messagebox.showwarning("Atención","Cantidad inválida")
-            return
-        if not codigo or cantidad <= 0:
-            messagebox.showwarning("Atención","Ingrese código y cantidad válida")
-            return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'stock'] = max(int(df.at[idx,'stock']) - cantidad, 0)
-            save_df(ARCHIVO_INVENTARIO, df)
-            self.cargar_datos()
-            messagebox.showinfo("OK",f"Descontado {cantidad} de {codigo}")
-        else:
-            messagebox.showwarning("No encontrado","Código no encontrado")
+        with self.inventario.lock:
+            etiquetas = self.inventario.buscar_texto(desc, campos=("descripcion",))
+            filas = preparar_filas_inventario(self.inventario.df.loc[etiquetas])
+        self.tabla.cargar(filas)
 
     # --------------------------------------------------------
-    # AGREGAR / BORRAR ARTÍCULO
+    # BORRAR ARTÍCULO
     # --------------------------------------------------------
-    def agregar_articulo(self):
-        codigo = self.art_codigo.get().strip()
-        desc = self.art_desc.get().strip()
-        ubi = self.art_ubi.get().strip()
-        try: stock = int(self.art_stock.get())
-        except:
-            messagebox.showwarning("Atención","Stock inválido")
-            return
-        try: precio = float(self.art_precio.get())
-        except:
-            messagebox.showwarning("Atención","Precio inválido")
-            return
-        if not codigo:
-            messagebox.showwarning("Atención","Código requerido")
-            return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo.upper()
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'descripcion'] = desc
-            df.at[idx,'ubicacion'] = ubi
-            df.at[idx,'stock'] = stock
-            df.at[idx,'precio'] = precio
-        else:
-            df.loc[len(df)] = [codigo, desc, ubi, stock, precio]
-        save_df(ARCHIVO_INVENTARIO, df)
-        self.cargar_datos()
-        messagebox.showinfo("OK","Artículo agregado/actualizado")
-
     def borrar_seleccionado(self):
-        sel = self.tree.selection()
+        sel = self.tabla.seleccion()
         if not sel: return
-        df = load_inventario_file()
-        for s in sel:
-            codigo = self.tree.item(s)['values'][0]
-            df = df[df['codigo'].astype(str).str.upper() != codigo.upper()]
-        save_df(ARCHIVO_INVENTARIO, df)
-        self.cargar_datos()
+        self.inventario.borrar(sel)
+        self.inventario.guardar()
+        self.tabla.quitar(sel)
         messagebox.showinfo("OK","Artículo(s) borrado(s)")
 
          # --------------------------------------------------------
@@ -421,17 +2144,9 @@ class Stock(ttk.Frame):
     # --------------------------------------------------------
     def enviar_a_render(self, articulo):
         """
-        Envía un artículo actualizado al servidor en Render.
+        Deja un artículo actualizado en la cola de envío a Render (no espera a la red).
         """
-        url = "https://jq-motors-inventarios.onrender.com/inventario"
-        try:
-            resp = requests.post(url, json=articulo, timeout=5)
-            if resp.status_code == 200:
-                print(f"Sincronizado con Render: {articulo['codigo']}")
-            else:
-                print(f"Error al enviar a Render: {resp.status_code}")
-        except Exception as e:
-            print(f"No se pudo enviar a Render: {e}")
+        sincronizador_de(self.controller).encolar(articulo)
 
     # Modificar las funciones existentes para enviar cambios automáticamente
     def agregar_refaccion(self):
@@ -443,24 +2158,16 @@ class Stock(ttk.Frame):
         if not codigo or cantidad <= 0:
             messagebox.showwarning("Atención","Ingrese código y cantidad válida")
             return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'stock'] = int(df.at[idx,'stock']) + cantidad
-            save_df(ARCHIVO_INVENTARIO, df)
-            self.cargar_datos()
+        idx = self.inventario.buscar(codigo)
+        if idx is not None:
+            df = self.inventario.df
+            self.inventario.actualizar(idx, {'stock': int(df.at[idx,'stock']) + cantidad})
+            self.inventario.guardar()
+            self.refrescar_fila(codigo)
             messagebox.showinfo("OK",f"Agregado {cantidad} a {codigo}")
 
             # enviar a Render
-            row = df.loc[idx]
-            self.enviar_a_render({
-                "codigo": row['codigo'],
-                "descripcion": row.get('descripcion',''),
-                "ubicacion": row.get('ubicacion',''),
-                "stock": row.get('stock',0),
-                "precio": row.get('precio',0)
-            })
+            self.enviar_a_render(articulo_render(df.loc[idx]))
         else:
             messagebox.showwarning("No encontrado","Código no encontrado")
 
@@ -473,24 +2180,16 @@ class Stock(ttk.Frame):
         if not codigo or cantidad <= 0:
             messagebox.showwarning("Atención","Ingrese código y cantidad válida")
             return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'stock'] = max(int(df.at[idx,'stock']) - cantidad, 0)
-            save_df(ARCHIVO_INVENTARIO, df)
-            self.cargar_datos()
+        idx = self.inventario.buscar(codigo)
+        if idx is not None:
+            df = self.inventario.df
+            self.inventario.actualizar(idx, {'stock': max(int(df.at[idx,'stock']) - cantidad, 0)})
+            self.inventario.guardar()
+            self.refrescar_fila(codigo)
             messagebox.showinfo("OK",f"Descontado {cantidad} de {codigo}")
 
             # enviar a Render
-            row = df.loc[idx]
-            self.enviar_a_render({
-                "codigo": row['codigo'],
-                "descripcion": row.get('descripcion',''),
-                "ubicacion": row.get('ubicacion',''),
-                "stock": row.get('stock',0),
-                "precio": row.get('precio',0)
-            })
+            self.enviar_a_render(articulo_render(df.loc[idx]))
         else:
             messagebox.showwarning("No encontrado","Código no encontrado")
 
@@ -509,31 +2208,20 @@ class Stock(ttk.Frame):
         if not codigo:
             messagebox.showwarning("Atención","Código requerido")
             return
-        df = load_inventario_file()
-        mask = df['codigo'].astype(str).str.upper() == codigo.upper()
-        if mask.any():
-            idx = df[mask].index[0]
-            df.at[idx,'descripcion'] = desc
-            df.at[idx,'ubicacion'] = ubi
-            df.at[idx,'stock'] = stock
-            df.at[idx,'precio'] = precio
+        idx = self.inventario.buscar(codigo)
+        if idx is not None:
+            self.inventario.actualizar(idx, {'descripcion': desc, 'ubicacion': ubi, 'stock': stock, 'precio': precio})
         else:
-            df.loc[len(df)] = [codigo, desc, ubi, stock, precio]
-            idx = df.index[-1]
+            idx = self.inventario.agregar({'codigo': codigo, 'descripcion': desc, 'ubicacion': ubi,
+                                           'stock': stock, 'precio': precio})
+        df = self.inventario.df
 
-        save_df(ARCHIVO_INVENTARIO, df)
-        self.cargar_datos()
+        self.inventario.guardar()
+        self.refrescar_fila(codigo)
         messagebox.showinfo("OK","Artículo agregado/actualizado")
 
         # enviar a Render
-        row = df.loc[idx]
-        self.enviar_a_render({
-            "codigo": row['codigo'],
-            "descripcion": row.get('descripcion',''),
-            "ubicacion": row.get('ubicacion',''),
-            "stock": row.get('stock',0),
-            "precio": row.get('precio',0)
-        })
+        self.enviar_a_render(articulo_render(df.loc[idx]))
 
 # --------------------
 # Clase Ventas
@@ -542,6 +2230,7 @@ class Ventas(ttk.Frame):
     def __init__(self, parent, controller=None):
         super().__init__(parent)
         self.controller = controller
+        self.inventario = inventario_de(controller)
         ttk.Label(self, text='VENTAS', font=('Segoe UI', 12, 'bold')).pack(anchor='w', padx=6, pady=6)
         # ------------------
         # Panel de ingreso de venta
@@ -552,8 +2241,10 @@ class Ventas(ttk.Frame):
         self.cod_entry = ttk.Entry(frame_venta, width=15)
         self.cod_entry.grid(row=0, column=1, padx=4, pady=4)
         self.cod_entry.bind("<FocusOut>", self.completar_datos)  # Autocompleta al salir del campo
-        # Para autocompletar mientras se escribe, usar:
-        # self.cod_entry.bind("<KeyRelease>", self.completar_datos)
+        # Autocompletar mientras se escribe (búsqueda indexada en memoria)
+        self.cod_entry.bind("<KeyRelease>", self.completar_datos)
+        self.sugerencias_cod = ListaSugerencias(self.cod_entry, self.inventario.sugerencias,
+                                                al_elegir=lambda codigo: self.completar_datos())
         ttk.Label(frame_venta, text="Descripción:").grid(row=0, column=2, padx=4, pady=4)
         self.desc_entry = ttk.Entry(frame_venta, width=30)
         self.desc_entry.grid(row=0, column=3, padx=4, pady=4)
@@ -600,10 +2291,8 @@ class Ventas(ttk.Frame):
         codigo = self.cod_entry.get().strip().upper()
         if not codigo:
             return
-        df = load_inventario_file()  # Lee inventario.xlsx o lo crea vacío si no existe
-        mask = df['codigo'].astype(str).str.upper() == codigo
-        if mask.any():
-            fila = df[mask].iloc[0]
+        fila = self.inventario.fila(codigo)  # Inventario en memoria, búsqueda por índice
+        if fila is not None:
             self.desc_entry.delete(0, tk.END)
             self.desc_entry.insert(0, fila['descripcion'])
             self.precio_entry.delete(0, tk.END)
@@ -651,32 +2340,24 @@ class Ventas(ttk.Frame):
     # ------------------
     def guardar_excel_y_actualizar(self):
         try:
-            productos = [self.tree.item(i)["values"] for i in self.tree.get_children()]
+            items = self.tree.get_children()
+            productos = [self.tree.item(i)["values"] for i in items]
             if not productos:
                 messagebox.showwarning("Atención", "No hay productos en la venta.")
                 return
-            # Crear DataFrame con las columnas correctas
+            # Crear DataFrame con las columnas correctas (el código tal cual se escribió, sin convertir a número)
             df_nuevo = pd.DataFrame(productos, columns=["Forma_Pago", "Código", "Cantidad", "P_Unitario", "Precio", "Total"])
-            # Leer archivo existente o crear uno nuevo
-            if ARCHIVO_VENTAS.exists():
-                df_exist = pd.read_excel(ARCHIVO_VENTAS, engine="openpyxl")
-                df_comb = pd.concat([df_exist, df_nuevo], ignore_index=True)
-            else:
-                df_comb = df_nuevo
-            # Ordenar por forma de pago
-            orden = ["Efectivo", "Tarjeta", "Transferencia"]
-            df_comb["Forma_Pago"] = pd.Categorical(df_comb["Forma_Pago"], categories=orden, ordered=True)
-            df_comb = df_comb.sort_values("Forma_Pago")
-            # Guardar ventas
-            df_comb.to_excel(ARCHIVO_VENTAS, index=False, engine="openpyxl")
-            # Actualizar inventario
-            df_inv = load_inventario_file()
-            for _, row in df_nuevo.iterrows():
-                mask = df_inv['codigo'].astype(str).str.upper() == row['Código'].upper()
-                if mask.any():
-                    idx = df_inv[mask].index[0]
-                    df_inv.at[idx, 'stock'] = max(0, int(df_inv.at[idx, 'stock']) - int(row['Cantidad']))
-            save_inventario_file(df_inv)
+            df_nuevo["Código"] = [self.tree.set(i, "codigo") for i in items]
+            # Guardar ventas: solo se anexan las filas nuevas (el orden por forma de pago se aplica al volcar)
+            append_df(ARCHIVO_VENTAS, df_nuevo)
+            # Actualizar inventario: una resta por código, todas de una vez
+            cantidades = (pd.to_numeric(df_nuevo["Cantidad"], errors="coerce").fillna(0).astype(int)
+                          .groupby(df_nuevo["Código"].map(normalizar_codigo)).sum())
+            self.inventario.descontar_lote(cantidades)
+            self.inventario.guardar()
+            # Avisar a Render de los códigos que cambiaron (en segundo plano)
+            filas = (self.inventario.fila(codigo) for codigo in cantidades.index)
+            sincronizador_de(self.controller).encolar_lote([articulo_render(f) for f in filas if f is not None])
             messagebox.showinfo("Éxito", f"Venta guardada y stock actualizado.\nArchivo: {ARCHIVO_VENTAS}")
             # Limpiar tabla
             for i in self.tree.get_children():
@@ -686,11 +2367,80 @@ class Ventas(ttk.Frame):
 # ===============================
 # COTIZACION
 # ===============================
+COLUMNAS_COTIZACION = ["Código", "Descripción", "Precio", "Cantidad", "Total", "Disponibilidad"]
+
+class ModeloCotizacion:
+    """
+    Renglones de la cotización en columnas compactas (array) con el total siempre al día.
+    Los importes se llevan en centavos enteros: sumar y restar renglones no acumula error.
+    El id de cada renglón es su posición (se usa como iid del Treeview); un renglón quitado
+    queda marcado como inactivo y no se recorre la lista para recalcular nada.
+    """
+    def __init__(self):
+        self.limpiar()
+
+    def limpiar(self):
+        self.codigos = []
+        self.descripciones = []
+        self.disponibilidad = []
+        self.precios = array("d")
+        self.cantidades = array("q")
+        self.totales = array("q")  # centavos
+        self.activos = bytearray()
+        self.total_centavos = 0
+        self.n = 0  # renglones activos
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def total(self):
+        return self.total_centavos / 100
+
+    def agregar(self, codigo, descripcion, precio, cantidad, disponibilidad):
+        """Agrega un renglón y devuelve su id (texto, para usarlo de iid)."""
+        centavos = round(precio * cantidad * 100)
+        self.codigos.append(codigo)
+        self.descripciones.append(descripcion)
+        self.disponibilidad.append(disponibilidad)
+        self.precios.append(precio)
+        self.cantidades.append(cantidad)
+        self.totales.append(centavos)
+        self.activos.append(1)
+        self.total_centavos += centavos
+        self.n += 1
+        return str(len(self.activos) - 1)
+
+    def quitar(self, iid):
+        i = int(iid)
+        if self.activos[i]:
+            self.activos[i] = 0
+            self.total_centavos -= self.totales[i]
+            self.n -= 1
+
+    def renglon(self, i):
+        return (self.codigos[i], self.descripciones[i], self.precios[i], self.cantidades[i],
+                self.totales[i] / 100, self.disponibilidad[i])
+
+    def valores(self, iid):
+        # Textos para el Treeview
+        codigo, desc, precio, cantidad, total, disp = self.renglon(int(iid))
+        return (codigo, desc, f"{precio:.2f}", cantidad, f"{total:.2f}", disp)
+
+    def renglones(self):
+        # Valores con su tipo (precio y total float, cantidad int), en orden de alta
+        return [self.renglon(i) for i, activo in enumerate(self.activos) if activo]
+
+    def df(self):
+        return pd.DataFrame(self.renglones(), columns=COLUMNAS_COTIZACION)
+
 class Cotizacion(ttk.Frame):
-    def __init__(self, parent, controller=None, inventario_df=None):
+    def __init__(self, parent, controller=None):
         super().__init__(parent)
         self.controller = controller
-        self.inventario_df = inventario_df
+        self.inventario = inventario_de(controller)
+        # Los renglones viven en el modelo; el Treeview solo los muestra
+        self.modelo = ModeloCotizacion()
         # ------------------------
         # Variables
         # ------------------------
@@ -743,7 +2493,7 @@ class Cotizacion(ttk.Frame):
         # ------------------------
         # Treeview
         # ------------------------
-        columnas = ("Código", "Descripción", "Precio", "Cantidad", "Total", "Disponibilidad")
+        columnas = tuple(COLUMNAS_COTIZACION)
         self.tree = ttk.Treeview(self, columns=columnas, show="headings", height=12)
         for col in columnas:
             self.tree.heading(col, text=col)
@@ -765,6 +2515,7 @@ class Cotizacion(ttk.Frame):
         ttk.Button(frame_acciones_final, text="Eliminar Seleccionado", command=self.eliminar_producto).pack(side="left", padx=5)
         ttk.Button(frame_acciones_final, text="Guardar en Excel", command=self.guardar_excel).pack(side="left", padx=5)
         ttk.Button(frame_acciones_final, text="Crear Ticket PDF", command=self.crear_ticket_pdf).pack(side="left", padx=5)
+        ttk.Button(frame_acciones_final, text="Tickets del Día", command=self.tickets_del_dia).pack(side="left", padx=5)
     # =====================================================
     # AUTOCOMPLETAR PRODUCTO
     # =====================================================
@@ -773,21 +2524,16 @@ class Cotizacion(ttk.Frame):
         if len(codigo) < 1:
             return
         try:
-            df = load_inventario_file()
-            df.columns = df.columns.str.strip().str.lower()
-            df.fillna("", inplace=True)
-            if "codigo" not in df.columns:
-                df["codigo"] = df.iloc[:, 0]
-            df["codigo_clean"] = df["codigo"].apply(lambda x: quitar_acentos(str(x)).upper())
-            resultado = df[df["codigo_clean"] == codigo]
-            if resultado.empty:
-                resultado = df[df["codigo_clean"].str.contains(codigo, na=False)]
-                if resultado.empty:
-                    for e in [self.entry_desc, self.entry_precio, self.entry_stock]:
-                        e.delete(0, tk.END)
-                    self.total_parcial_var.set("0.00")
-                    return
-            fila = resultado.iloc[0]
+            fila = self.inventario.fila(codigo)
+            if fila is None:
+                with self.inventario.lock:
+                    resultado = self.inventario.buscar_texto(codigo, limite=1, campos=("codigo",))
+                    if not resultado:
+                        for e in [self.entry_desc, self.entry_precio, self.entry_stock]:
+                            e.delete(0, tk.END)
+                        self.total_parcial_var.set("0.00")
+                        return
+                    fila = self.inventario.df.loc[resultado[0]]
             self.entry_desc.delete(0, tk.END)
             self.entry_desc.insert(0, fila.get("descripcion", ""))
             self.entry_precio.delete(0, tk.END)
@@ -820,9 +2566,9 @@ class Cotizacion(ttk.Frame):
             desc = self.entry_desc.get().strip()
             precio = float(self.entry_precio.get())
             cantidad = int(self.entry_cantidad.get())
-            total = precio * cantidad
             disp = self.combo_disp.get().strip()
-            self.tree.insert("", tk.END, values=(codigo, desc, f"{precio:.2f}", cantidad, f"{total:.2f}", disp))
+            iid = self.modelo.agregar(codigo, desc, precio, cantidad, disp)
+            self.tree.insert("", tk.END, iid=iid, values=self.modelo.valores(iid))
             for e in [self.entry_codigo, self.entry_desc, self.entry_precio, self.entry_stock, self.entry_cantidad]:
                 e.delete(0, tk.END)
             self.combo_disp.set("Disponible")
@@ -836,66 +2582,277 @@ class Cotizacion(ttk.Frame):
     def eliminar_producto(self):
         sel = self.tree.selection()
         for item in sel:
+            # iid = renglón del modelo
+            self.modelo.quitar(item)
             self.tree.delete(item)
         self.recalcular_total_general()
     # =====================================================
     # TOTAL GENERAL
     # =====================================================
     def recalcular_total_general(self):
-        total = 0.0
-        for item in self.tree.get_children():
-            try:
-                total += float(self.tree.item(item)["values"][4])
-            except:
-                pass
-        self.total_general_var.set(f"{total:,.2f}")
+        # El modelo ya tiene el total: no se leen los textos del Treeview
+        self.total_general_var.set(f"{self.modelo.total:,.2f}")
     # =====================================================
     # GUARDAR EXCEL
     # =====================================================
     def guardar_excel(self):
-        try:
-            productos = [self.tree.item(i)["values"] for i in self.tree.get_children()]
-            if not productos:
-                messagebox.showwarning("Atención", "No hay productos para guardar.")
-                return
-            df = pd.DataFrame(productos, columns=["Código", "Descripción", "Precio", "Cantidad", "Total", "Disponibilidad"])
-            archivo = "cotizacion.xlsx"
+        if not len(self.modelo):
+            messagebox.showwarning("Atención", "No hay productos para guardar.")
+            return
+        df = self.modelo.df()
+        archivo = "cotizacion.xlsx"
+        def trabajo(tarea):
             df.to_excel(archivo, index=False)
-            messagebox.showinfo("Éxito", f"Cotización guardada en {archivo}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar en Excel: {e}")
+            # Historial de cotizaciones
+            append_df(ARCHIVO_COTIZACIONES, df.assign(fecha=datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        ejecutor_de(self.controller, self).enviar(
+            trabajo, recurso=archivo,
+            al_terminar=lambda _: messagebox.showinfo("Éxito", f"Cotización guardada en {archivo}"),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo guardar en Excel: {e}"))
     # =====================================================
     # CREAR TICKET PDF
     # =====================================================
     def crear_ticket_pdf(self):
-        try:
-            productos = [self.tree.item(i)["values"] for i in self.tree.get_children()]
-            if not productos:
-                messagebox.showwarning("Atención", "No hay productos para exportar.")
-                return
-            from reportlab.pdfgen import canvas
-            archivo = "ticket_cotizacion.pdf"
-            c = canvas.Canvas(archivo)
-            y = 800
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(50, y, "COTIZACIÓN")
-            y -= 30
-            c.setFont("Helvetica", 10)
-            for p in productos:
-                linea = f"{p[0]} | {p[1]} | {p[3]} x ${p[2]} = ${p[4]}"
-                c.drawString(40, y, linea)
-                y -= 20
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(40, y-10, f"TOTAL GENERAL: ${self.total_general_var.get()}")
-            c.save()
-            messagebox.showinfo("Éxito", f"PDF creado: {archivo}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo crear el PDF: {e}")
+        if not len(self.modelo):
+            messagebox.showwarning("Atención", "No hay productos para exportar.")
+            return
+        seccion = seccion_cotizacion(self.modelo.renglones(), self.modelo.total)
+        archivo = "ticket_cotizacion.pdf"
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: motor_reportes().generar(archivo, [seccion]), recurso=archivo,
+            al_terminar=lambda _: messagebox.showinfo("Éxito", f"PDF creado: {archivo}"),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo crear el PDF: {e}"))
+    # =====================================================
+    # TICKETS DEL DÍA
+    # =====================================================
+    def tickets_del_dia(self):
+        # Un ticket por cotización guardada hoy (historial de cotizaciones, agrupado por fecha de guardado)
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        carpeta = CARPETA_EXPORT / f"tickets_{hoy}"
+        def trabajo(tarea):
+            historial = load_file(ARCHIVO_COTIZACIONES, COLUMNAS_COTIZACION + ["fecha"])
+            del_dia = historial[historial["fecha"].astype(str).str.startswith(hoy)]
+            trabajos = []
+            for n, (fecha, grupo) in enumerate(del_dia.groupby("fecha", sort=True), 1):
+                total = pd.to_numeric(grupo["Total"], errors="coerce").fillna(0).sum()
+                seccion = seccion_cotizacion(grupo[COLUMNAS_COTIZACION].values.tolist(), total,
+                                             titulo=f"COTIZACIÓN {fecha}")
+                trabajos.append((carpeta / f"cotizacion_{n:03d}.pdf", [seccion]))
+            if trabajos:
+                carpeta.mkdir(parents=True, exist_ok=True)
+            return motor_reportes().generar_lote(trabajos)
+        def listo(rutas):
+            if rutas:
+                messagebox.showinfo("Éxito", f"{len(rutas)} tickets creados en {carpeta}")
+            else:
+                messagebox.showinfo("Tickets", "No hay cotizaciones guardadas hoy.")
+        ejecutor_de(self.controller, self).enviar(
+            trabajo, recurso=carpeta, al_terminar=listo,
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudieron crear los tickets: {e}"))
+# --------------------
+# TALLER: INSUMOS POR MOTO
+# --------------------
+COLUMNAS_INSUMO = ["codigo", "descripcion", "cantidad", "precio", "total"]
+_SELLOS_MOTO = itertools.count(1)  # versiones únicas entre todas las motos de la sesión
+
+class InsumoTaller:
+    __slots__ = ("codigo", "descripcion", "cantidad", "precio")
+
+    def __init__(self, codigo, descripcion, cantidad, precio):
+        self.codigo = codigo
+        self.descripcion = descripcion
+        self.cantidad = cantidad
+        self.precio = precio
+
+    @property
+    def total(self):
+        return round(self.cantidad * self.precio, 2)
+
+    def valores(self):
+        # Orden de las columnas del Treeview de insumos
+        return (self.codigo, self.cantidad, self.descripcion, self.precio, self.total)
+
+    def como_dict(self):
+        return {"codigo": self.codigo, "descripcion": self.descripcion, "cantidad": self.cantidad,
+                "precio": self.precio, "total": self.total}
+
+class MotoTaller:
+    """
+    Insumos de una moto indexados por código, con el total de la moto siempre al día.
+    Agregar o quitar un insumo no recorre la lista ni vuelve a sumar todo.
+    version cambia con cada modificación: al guardar solo se escriben las motos cuya
+    version no es la que quedó guardada.
+    """
+    __slots__ = ("nombre", "insumos", "centavos", "version")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.insumos = {}  # codigo -> InsumoTaller (en orden de alta)
+        self.centavos = 0  # total en centavos enteros: sumar y restar no acumula error
+        self.version = next(_SELLOS_MOTO)
+
+    def __len__(self):
+        return len(self.insumos)
+
+    @property
+    def total(self):
+        return self.centavos / 100
+
+    def agregar(self, codigo, descripcion, cantidad, precio):
+        # Si el código ya está se suman las cantidades y queda el último precio
+        ins = self.insumos.get(codigo)
+        if ins is None:
+            ins = self.insumos[codigo] = InsumoTaller(codigo, descripcion, cantidad, precio)
+        else:
+            self.centavos -= round(ins.total * 100)
+            ins.cantidad += cantidad
+            ins.precio = precio
+            ins.descripcion = descripcion
+        self.centavos += round(ins.total * 100)
+        self.version = next(_SELLOS_MOTO)
+        return ins
+
+    def quitar(self, codigo):
+        ins = self.insumos.pop(codigo, None)
+        if ins is not None:
+            self.centavos -= round(ins.total * 100)
+            self.version = next(_SELLOS_MOTO)
+        return ins
+
+    def registros(self):
+        return [ins.como_dict() for ins in self.insumos.values()]
+
+    def df(self):
+        return pd.DataFrame(self.registros(), columns=COLUMNAS_INSUMO)
+
+    @classmethod
+    def desde_filas(cls, nombre, filas):
+        """
+        Moto a partir de los renglones de una hoja, el primero con los títulos
+        (p. ej. ws.iter_rows(values_only=True)). Cantidad y precio no numéricos cuentan como 0.
+        """
+        moto = cls(nombre)
+        filas = iter(filas)
+        titulos = [str(c).strip().lower() if c is not None else "" for c in next(filas, ())]
+        posiciones = [titulos.index(c) if c in titulos else None for c in ("codigo", "descripcion", "cantidad", "precio")]
+        def celda(fila, i):
+            return fila[i] if i is not None and i < len(fila) else None
+        for fila in filas:
+            codigo, desc, cant, precio = (celda(fila, i) for i in posiciones)
+            codigo = _celda_texto(codigo)
+            if codigo:  # renglones sin código (vacíos) no se cargan
+                moto.agregar(codigo, _celda_texto(desc), _celda_numero(cant), _celda_numero(precio))
+        return moto
+
+    @classmethod
+    def desde_df(cls, nombre, df):
+        return cls.desde_filas(nombre, itertools.chain([list(df.columns)], df.itertuples(index=False, name=None)))
+
+def _celda_texto(valor):
+    return "" if valor is None or valor != valor else str(valor).strip()
+
+def _celda_numero(valor):
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if valor != valor else valor
+
+def leer_libro_taller(ruta, tarea=None):
+    """
+    Todas las hojas de un libro en una sola pasada: ({hoja: MotoTaller}, {hoja: error}).
+    Con openpyxl read_only se recorren los renglones sin armar un DataFrame por hoja.
+    Los .xls se leen completos con pandas.
+    """
+    motos, errores = {}, {}
+    if Path(ruta).suffix.lower() == ".xls":
+        for hoja, df in pd.read_excel(ruta, sheet_name=None).items():
+            try:
+                motos[hoja] = MotoTaller.desde_df(hoja, df)
+            except Exception as e:
+                errores[hoja] = str(e)
+        return motos, errores
+    from openpyxl import load_workbook
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hojas = wb.worksheets
+        for n, ws in enumerate(hojas, 1):
+            if tarea is not None:
+                tarea.revisar()
+            try:
+                motos[ws.title] = MotoTaller.desde_filas(ws.title, ws.iter_rows(values_only=True))
+            except Exception as e:
+                errores[ws.title] = str(e)
+            if tarea is not None:
+                tarea.avanzar(n / len(hojas), ws.title)
+    finally:
+        wb.close()
+    return motos, errores
+
+# --------------------
+# TALLER: CIERRE DEL DÍA
+# --------------------
+# Libro y PDF de todas las motos en CARPETA_EXPORT. Cada archivo se arma en su propio proceso
+# (openpyxl y reportlab son puro Python: con hilos se estorbarían por el GIL).
+# Siempre "spawn": un fork desde la app copiaría Tk y los candados tomados por otros hilos
+PROCESOS_CIERRE = 2
+
+def nombre_hoja(nombre, usados):
+    # Excel: máximo 31 caracteres, sin []:*?/\ y sin repetir (sin distinguir mayúsculas)
+    base = "".join("_" if c in '[]:*?/\\' else c for c in str(nombre)).strip()[:31] or "Moto"
+    hoja, n = base, 1
+    while hoja.lower() in usados:
+        n += 1
+        hoja = f"{base[:31 - len(str(n)) - 1]}_{n}"
+    usados.add(hoja.lower())
+    return hoja
+
+def escribir_cierre_excel(archivo, motos):
+    """motos = {moto: registros}. Hoja RESUMEN con el total por moto y una hoja por moto."""
+    usados = {"resumen"}
+    resumen = pd.DataFrame([(moto, len(insumos), round(sum(i["total"] for i in insumos), 2))
+                            for moto, insumos in motos.items()], columns=["moto", "insumos", "total"])
+    def escribir(tmp):
+        with pd.ExcelWriter(tmp, engine="openpyxl") as writer:
+            resumen.to_excel(writer, sheet_name="RESUMEN", index=False)
+            for moto, insumos in motos.items():
+                pd.DataFrame(insumos, columns=COLUMNAS_INSUMO).to_excel(
+                    writer, sheet_name=nombre_hoja(moto, usados), index=False)
+    return reemplazar_atomico(archivo, escribir)
+
+def escribir_cierre_pdf(archivo, motos):
+    """Un solo PDF: resumen del día y después una sección (página nueva) por moto."""
+    filas = [(moto, len(insumos), _dinero(sum(i["total"] for i in insumos))) for moto, insumos in motos.items()]
+    resumen = {"titulo": f"Cierre de taller {datetime.now():%d/%m/%Y}", "columnas": ["Moto", "Insumos", "Total"],
+               "filas": filas, "total": _dinero(sum(i["total"] for insumos in motos.values() for i in insumos))}
+    secciones = [resumen] + [seccion_taller(moto, insumos) for moto, insumos in motos.items()]
+    return motor_reportes().generar(archivo, secciones)
+
+def exportar_cierre_taller(motos, carpeta=CARPETA_EXPORT, tarea=None):
+    """Genera cierre_taller_<fecha>.xlsx y .pdf en paralelo; devuelve las dos rutas."""
+    sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archivo_excel = Path(carpeta) / f"cierre_taller_{sello}.xlsx"
+    archivo_pdf = Path(carpeta) / f"cierre_taller_{sello}.pdf"
+    # A los procesos solo van datos simples: rutas como texto y {moto: [dict]}
+    motos = {str(moto): [dict(insumo) for insumo in insumos] for moto, insumos in motos.items()}
+    with ProcessPoolExecutor(max_workers=PROCESOS_CIERRE,
+                             mp_context=multiprocessing.get_context("spawn")) as procesos:
+        futuros = [procesos.submit(escribir_cierre_excel, str(archivo_excel), motos),
+                   procesos.submit(escribir_cierre_pdf, str(archivo_pdf), motos)]
+        for n, futuro in enumerate(futuros, 1):
+            futuro.result()  # propaga el error del proceso
+            if tarea is not None:
+                tarea.avanzar(n / len(futuros))
+    return archivo_excel, archivo_pdf
+
 class Taller(ttk.Frame):
     def __init__(self, parent, controller=None):
         super().__init__(parent)
         self.controller = controller
-        self.motos = {}  # {"Moto1": [{"codigo":.., "descripcion":.., "precio":.., "cantidad":.., "total":..}, ...]}
+        self.inventario = inventario_de(controller)
+        self.motos = {}  # {"Moto1": MotoTaller}
+        # Por archivo, la version de cada moto que ya está escrita: {ARCHIVO_TALLER: {"Moto1": 7}}
+        self.versiones_guardadas = {}
         tk.Label(self, text="TALLER", font=("Arial", 20), bg="white").pack(pady=10)
         frame_top = ttk.Frame(self)
         frame_top.pack(fill="x", padx=10, pady=(20,5))
@@ -904,6 +2861,7 @@ class Taller(ttk.Frame):
         ttk.Button(frame_botones, text="📥 Importar Archivo", command=self.importar_archivo).pack(side="top", pady=2)
         ttk.Button(frame_botones, text="Exportar Excel", command=self.exportar_excel).pack(side="top", pady=2)
         ttk.Button(frame_botones, text="Crear PDF", command=self.crear_pdf).pack(side="top", pady=2)
+        ttk.Button(frame_botones, text="Cierre del día", command=self.cierre_del_dia).pack(side="top", pady=2)
         # Treeview de motos
         self.tree_motos = ttk.Treeview(frame_top, columns=("Moto", "Total"), show="headings", height=6)
         self.tree_motos.heading("Moto", text="Moto")
@@ -918,6 +2876,8 @@ class Taller(ttk.Frame):
         ttk.Button(frame_acciones, text="Borrar Moto", command=self.borrar_moto).pack(fill="x", pady=2)
         ttk.Button(frame_acciones, text="Agregar Insumo", command=self.agregar_insumo).pack(fill="x", pady=2)
         ttk.Button(frame_acciones, text="Guardar Taller", command=self.guardar_taller).pack(fill="x", pady=2)       
+        # taller.xlsx se lee en segundo plano: la pestaña aparece de inmediato
+        self.cargado = False
         self.cargar_taller()
     # -------------------------- MÉTODOS DE MOTO --------------------------
     def agregar_moto(self):
@@ -928,7 +2888,7 @@ class Taller(ttk.Frame):
         if nombre in self.motos:
             messagebox.showwarning("Atención", "La moto ya existe.")
             return
-        self.motos[nombre] = []
+        self.motos[nombre] = MotoTaller(nombre)
         self.tree_motos.insert("", "end", iid=nombre, values=(nombre, "0.00"))
     def borrar_moto(self):
         sel = self.tree_motos.selection()
@@ -946,6 +2906,7 @@ class Taller(ttk.Frame):
             messagebox.showwarning("Atención", "Seleccione primero una moto.")
             return
         moto = sel[0]
+        datos_moto = self.motos[moto]
         win = tk.Toplevel(self)
         win.title(f"Insumos - {moto}")
         win.geometry("800x650")
@@ -977,20 +2938,27 @@ class Taller(ttk.Frame):
                 tree_ins.heading(c, text=c.capitalize())
                 tree_ins.column(c, width=100, anchor="center")
         tree_ins.grid(row=5, column=0, columnspan=4, padx=6, pady=6, sticky="nsew")
+        # iid de cada renglón = código del insumo: se encuentra sin recorrer la tabla
+        for ins in datos_moto.insumos.values():
+            tree_ins.insert("", "end", iid=ins.codigo, values=ins.valores())
 
         # Función de autocompletar descripción y precio
+        autocompletar_programado = [None]
+        def programar_autocompletar(*args):
+                # Se busca cuando se deja de teclear, no en cada letra
+                if autocompletar_programado[0] is not None:
+                        win.after_cancel(autocompletar_programado[0])
+                autocompletar_programado[0] = win.after(ESPERA_AUTOCOMPLETAR, actualizar_autocompletar)
         def actualizar_autocompletar(*args):
+                autocompletar_programado[0] = None
                 codigo = codigo_var.get().strip().upper()
                 if not codigo:
                         descripcion_var.set("")
                         precio_var.set("0.00")
                         return
                 try:
-                        df = pd.read_excel(ARCHIVO_INVENTARIO, engine="openpyxl")
-                        df['codigo'] = df['codigo'].astype(str)
-                        prod = df[df['codigo'].str.upper() == codigo]
-                        if not prod.empty:
-                                fila = prod.iloc[0]
+                        fila = self.inventario.fila(codigo)
+                        if fila is not None:
                                 descripcion_var.set(fila["descripcion"])
                                 precio_var.set(str(fila["precio"]))
                         else:
@@ -1000,7 +2968,10 @@ class Taller(ttk.Frame):
                         descripcion_var.set("")
                         precio_var.set("0.00")
                 actualizar_total()
-        codigo_var.trace("w", actualizar_autocompletar)
+        codigo_var.trace("w", programar_autocompletar)
+        # Lista de códigos parecidos (índice del inventario compartido, sin leer el Excel)
+        ListaSugerencias(entry_codigo, self.inventario.sugerencias,
+                         al_elegir=lambda codigo: actualizar_autocompletar(), espera=ESPERA_AUTOCOMPLETAR)
         # Función actualizar total
         def actualizar_total(*args):
                 try:
@@ -1012,43 +2983,29 @@ class Taller(ttk.Frame):
         precio_var.trace("w", actualizar_total)
         # Función agregar insumo al tree y al dict
         def agregar_local():
+                # Si el autocompletado sigue pendiente (se tecleó y se dio clic enseguida), aplicarlo ya
+                if autocompletar_programado[0] is not None:
+                        win.after_cancel(autocompletar_programado[0])
+                        actualizar_autocompletar()
                 try:
                         cant = float(cantidad_var.get())
                         precio = float(precio_var.get())
-                        total = float(total_var.get())
                         codigo = codigo_var.get().strip().upper()
                         desc = descripcion_var.get()
                 except:
                         messagebox.showwarning("Atención", "Cantidad o precio inválidos")
                         return
-                # Revisar si ya existe en Treeview
-                for iid in tree_ins.get_children():
-                        vals = tree_ins.item(iid)["values"]
-                        if vals[0] == codigo:
-                                nueva_cant = float(vals[1]) + cant
-                                nuevo_total = round(nueva_cant * precio, 2)
-                                tree_ins.item(iid, values=(codigo, nueva_cant, desc, precio, nuevo_total))
-                                break
-                else:
-                        tree_ins.insert("", "end", values=(codigo, cant, desc, precio, total))
-                # Actualizar dict
-                for ins in self.motos[moto]:
-                        if ins["codigo"] == codigo:
-                                ins["cantidad"] += cant
-                                ins["precio"] = precio
-                                ins["total"] = round(ins["cantidad"] * precio, 2)
-                                break
+                if not codigo:
+                        messagebox.showwarning("Atención", "Escriba el código del insumo.")
+                        return
+                # Un código se suma sobre su renglón existente
+                ins = datos_moto.agregar(codigo, desc, cant, precio)
+                if tree_ins.exists(codigo):
+                        tree_ins.item(codigo, values=ins.valores())
                 else:
-                        self.motos[moto].append({
-                                "codigo": codigo,
-                                "cantidad": cant,
-                                "descripcion": desc,
-                                "precio": precio,
-                                "total": total
-                        })
+                        tree_ins.insert("", "end", iid=codigo, values=ins.valores())
                 # Actualizar total de moto
-                total_moto = sum(i["total"] for i in self.motos[moto])
-                self.tree_motos.item(moto, values=(moto, f"{total_moto:.2f}"))
+                self.tree_motos.item(moto, values=(moto, f"{datos_moto.total:.2f}"))
                 # Limpiar entradas
                 codigo_var.set("")
                 descripcion_var.set("")
@@ -1062,70 +3019,110 @@ class Taller(ttk.Frame):
                         messagebox.showwarning("Atención", "Seleccione un insumo para borrar.")
                         return
                 for iid in seleccionado:
-                        vals = tree_ins.item(iid)["values"]
-                        codigo_borrar = vals[0]
-                        # Quitar del Treeview
+                        # iid = código del insumo
+                        datos_moto.quitar(iid)
                         tree_ins.delete(iid)
-                        # Quitar del dict
-                        self.motos[moto] = [ins for ins in self.motos[moto] if ins["codigo"] != codigo_borrar]
                 # Actualizar total de la moto
-                total_moto = sum(i["total"] for i in self.motos[moto])
-                self.tree_motos.item(moto, values=(moto, f"{total_moto:.2f}"))
+                self.tree_motos.item(moto, values=(moto, f"{datos_moto.total:.2f}"))
         # Botones
         ttk.Button(win, text="Agregar", command=agregar_local).grid(row=6, column=0, pady=6, padx=6)
         ttk.Button(win, text="Borrar Seleccionado", command=borrar_seleccionado).grid(row=6, column=1, pady=6, padx=6)
         ttk.Button(win, text="Cerrar", command=win.destroy).grid(row=6, column=2, pady=6, padx=6)
+    # -------------------------- CAMBIOS POR MOTO --------------------------
+    def cambios_pendientes(self, path):
+        """
+        (hojas, borradas, versiones) de lo que cambió desde el último guardado en path.
+        Una moto sin insumos no tiene hoja: se borra del libro.
+        """
+        guardadas = self.versiones_guardadas.setdefault(path, {})
+        hojas, borradas, versiones = {}, set(), {}
+        for moto, datos in self.motos.items():
+            if guardadas.get(moto) != datos.version:
+                versiones[moto] = datos.version
+                if len(datos):
+                    hojas[moto[:31]] = datos.df()
+                else:
+                    borradas.add(moto[:31])
+        for moto in guardadas:
+            if moto not in self.motos:
+                versiones[moto] = None
+                borradas.add(moto[:31])
+        return hojas, borradas - set(hojas), versiones
+
+    def marcar_guardadas(self, path, versiones):
+        guardadas = self.versiones_guardadas.setdefault(path, {})
+        for moto, version in versiones.items():
+            if version is None:
+                guardadas.pop(moto, None)
+            else:
+                guardadas[moto] = version
+
+    def guardar_cambios(self, path, al_terminar=None, al_fallar=None):
+        # Solo las motos modificadas; lo que se edite mientras se guarda queda pendiente
+        hojas, borradas, versiones = self.cambios_pendientes(path)
+        if not versiones:
+            return False
+        def terminar(_):
+            self.marcar_guardadas(path, versiones)
+            if al_terminar is not None:
+                al_terminar()
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: update_sheets(path, hojas, borradas), recurso=path,
+            al_terminar=terminar, al_fallar=al_fallar)
+        return True
+
     def guardar_motos(self):
-        from openpyxl import load_workbook
-        import pandas as pd
-        if ARCHIVO_MOTOS.exists():
-                wb = load_workbook(ARCHIVO_MOTOS)
-        else:
-                wb = None
-        with pd.ExcelWriter(ARCHIVO_MOTOS, engine="openpyxl") as writer:
-                if wb:
-                        writer.book = wb
-                        # Remover sheets existentes de motos para reemplazar
-                        for moto in self.motos.keys():
-                                if moto in writer.book.sheetnames:
-                                        idx = writer.book.sheetnames.index(moto)
-                                        ws = writer.book.worksheets[idx]
-                                        writer.book.remove(ws)
-                for moto, insumos in self.motos.items():
-                        df = pd.DataFrame(insumos, columns=["codigo","descripcion","cantidad","precio","total"])
-                        df.to_excel(writer, sheet_name=moto, index=False)
+        self.guardar_cambios(
+            ARCHIVO_MOTOS, al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo guardar motos_insumos: {e}"))
     # -------------------------- GUARDAR TALLER --------------------------
     def guardar_taller(self):
-        if not self.motos:
-            messagebox.showwarning("Atención", "No hay motos para guardar.")
+        if not self.cargado:
+            messagebox.showwarning("Atención", "El taller todavía se está cargando.")
             return
         os.makedirs(os.path.dirname(ARCHIVO_TALLER), exist_ok=True)
-        writer = pd.ExcelWriter(ARCHIVO_TALLER, engine="openpyxl")
-        for moto, insumos in self.motos.items():
-            if insumos:
-                df = pd.DataFrame(insumos)
-                df.to_excel(writer, sheet_name=moto[:31], index=False)
-        writer.close()
-        messagebox.showinfo("Éxito", "Taller guardado correctamente.")
+        guardando = self.guardar_cambios(
+            ARCHIVO_TALLER,
+            al_terminar=lambda: messagebox.showinfo("Éxito", "Taller guardado correctamente."),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo guardar el taller: {e}"))
+        if not guardando:
+            messagebox.showinfo("Taller", "No hay cambios por guardar.")
     # -------------------------- CARGAR TALLER --------------------------
     def cargar_taller(self):
-        if not os.path.exists(ARCHIVO_TALLER):
-            return
-        xls = pd.ExcelFile(ARCHIVO_TALLER, engine="openpyxl")
-        for sheet in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sheet, engine="openpyxl")
-            # Crear columnas si no existen
-            if "cantidad" not in df.columns:
-                df["cantidad"] = 0
-            if "precio" not in df.columns:
-                df["precio"] = 0
-            # Convertir a numérico y llenar NaN con 0
-            df["cantidad"] = pd.to_numeric(df["cantidad"], errors="coerce").fillna(0)
-            df["precio"] = pd.to_numeric(df["precio"], errors="coerce").fillna(0)
-            df["total"] = df["cantidad"] * df["precio"]
-            self.motos[sheet] = df.to_dict("records")
-            total_moto = df["total"].sum()
-            self.tree_motos.insert("", "end", iid=sheet, values=(sheet, f"{total_moto:.2f}"))
+        ejecutor_de(self.controller, self).enviar(
+            self.leer_taller, recurso=ARCHIVO_TALLER, al_terminar=self.mostrar_taller, al_fallar=self.error_al_cargar)
+
+    @staticmethod
+    def leer_taller(tarea=None):
+        # Solo datos (corre en un hilo): {moto: MotoTaller}
+        return {sheet: MotoTaller.desde_df(sheet, df) for sheet, df in load_sheets(ARCHIVO_TALLER).items()}
+
+    def poner_motos(self, motos, reemplazar=True):
+        """
+        Agrega (o reemplaza) varias motos de una vez y devuelve los nombres puestos.
+        Todo ocurre en un solo callback de Tk: la lista se redibuja una vez al terminar.
+        """
+        puestas = []
+        for nombre, datos in motos.items():
+            if not reemplazar and nombre in self.motos:
+                continue  # se creó a mano mientras se cargaba
+            self.motos[nombre] = datos
+            puestas.append(nombre)
+            valores = (nombre, f"{datos.total:.2f}")
+            if self.tree_motos.exists(nombre):
+                self.tree_motos.item(nombre, values=valores)
+            else:
+                self.tree_motos.insert("", "end", iid=nombre, values=valores)
+        return puestas
+
+    def mostrar_taller(self, motos):
+        guardadas = self.versiones_guardadas.setdefault(ARCHIVO_TALLER, {})
+        for nombre in self.poner_motos(motos, reemplazar=False):
+            guardadas[nombre] = motos[nombre].version  # tal como está en taller.xlsx
+        self.cargado = True
+
+    def error_al_cargar(self, error):
+        self.cargado = True
+        messagebox.showerror("Error", f"No se pudo cargar el taller: {error}")
     # -------------------------- EXPORTAR EXCEL --------------------------
     def exportar_excel(self):
         sel = self.tree_motos.selection()
@@ -1133,10 +3130,12 @@ class Taller(ttk.Frame):
             messagebox.showwarning("Atención", "Seleccione una moto")
             return
         moto = sel[0]
-        insumos = self.motos[moto]
+        df = self.motos[moto].df()
         archivo = f"{moto}_taller.xlsx"
-        pd.DataFrame(insumos).to_excel(archivo, index=False)
-        messagebox.showinfo("Éxito", f"Excel exportado: {archivo}")
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: reemplazar_atomico(archivo, lambda tmp: df.to_excel(tmp, index=False)), recurso=archivo,
+            al_terminar=lambda _: messagebox.showinfo("Éxito", f"Excel exportado: {archivo}"),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo exportar: {e}"))
     # -------------------------- CREAR PDF --------------------------
     def crear_pdf(self):
         sel = self.tree_motos.selection()
@@ -1144,21 +3143,27 @@ class Taller(ttk.Frame):
             messagebox.showwarning("Atención", "Seleccione una moto")
             return
         moto = sel[0]
-        insumos = self.motos[moto]
+        seccion = seccion_taller(moto, self.motos[moto].registros())
         archivo = f"{moto}_taller.pdf"
-        c = canvas.Canvas(archivo, pagesize=letter)
-        y = 750
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, y, f"Taller - {moto}")
-        y -= 30
-        total_general = 0
-        for i in insumos:
-            c.drawString(40, y, f'{i["codigo"]} - {i["descripcion"]} - {i["cantidad"]} x {i["precio"]} = {i["total"]}')
-            total_general += i["total"]
-            y -= 20
-        c.drawString(40, y, f"Total: {total_general:.2f}")
-        c.save()
-        messagebox.showinfo("Éxito", f"PDF creado: {archivo}")
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: motor_reportes().generar(archivo, [seccion]), recurso=archivo,
+            al_terminar=lambda _: messagebox.showinfo("Éxito", f"PDF creado: {archivo}"),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo crear el PDF: {e}"))
+    # -------------------------- CIERRE DEL DÍA --------------------------
+    def cierre_del_dia(self):
+        if not self.cargado:
+            messagebox.showwarning("Atención", "El taller todavía se está cargando.")
+            return
+        if not self.motos:
+            messagebox.showwarning("Atención", "No hay motos para exportar.")
+            return
+        # Solo datos simples: se mandan a otros procesos
+        motos = {moto: datos.registros() for moto, datos in self.motos.items()}
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: exportar_cierre_taller(motos, tarea=tarea), recurso=CARPETA_EXPORT,
+            al_terminar=lambda rutas: messagebox.showinfo(
+                "Éxito", f"Cierre exportado en {CARPETA_EXPORT}:\n{rutas[0].name}\n{rutas[1].name}"),
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo exportar el cierre: {e}"))
     # -----------------
     # Importar Excel
     # -----------------
@@ -1167,32 +3172,20 @@ class Taller(ttk.Frame):
                                           filetypes=[("Archivos Excel", "*.xlsx *.xls")])
         if not ruta:
             return
-        try:
-            xls = pd.ExcelFile(ruta, engine="openpyxl")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo abrir el archivo:{str(e)}")
-            return
-        for sheet in xls.sheet_names:
-            try:
-                df = pd.read_excel(xls, sheet_name=sheet, engine="openpyxl")
-                df["cantidad"] = pd.to_numeric(df.get("cantidad", 0), errors="coerce").fillna(0)
-                df["precio"] = pd.to_numeric(df.get("precio", 0), errors="coerce").fillna(0)
-                df["total"] = df["cantidad"] * df["precio"]
-                self.motos[sheet] = df.to_dict("records")
-                total_moto = df["total"].sum()
-                if not self.tree_motos.exists(sheet):
-                    self.tree_motos.insert("", "end", iid=sheet, values=(sheet, f"{total_moto:.2f}"))
-                else:
-                    self.tree_motos.item(sheet, values=(sheet, f"{total_moto:.2f}"))
-            except Exception as e:
-                messagebox.showwarning("Atención", f"No se pudo cargar la hoja '{sheet}': {e}")
+        # El libro se lee en un hilo; la lista de motos se actualiza al final, de una vez
+        ejecutor_de(self.controller, self).enviar(
+            lambda tarea: leer_libro_taller(ruta, tarea), recurso=ruta, al_terminar=self.mostrar_importacion,
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo abrir el archivo:{str(e)}"))
+
+    def mostrar_importacion(self, resultado):
+        motos, errores = resultado
+        self.poner_motos(motos)
+        if errores:
+            detalle = "\n".join(f"'{hoja}': {error}" for hoja, error in errores.items())
+            messagebox.showwarning("Atención", f"No se pudieron cargar estas hojas:\n{detalle}")
         messagebox.showinfo("Éxito", "Archivo importado correctamente.")
 # --------------------
 # MAIN APP
-# --------------------
-import threading
-from flask import Flask, jsonify
-
 # --------------------
 class AppUnificada(tk.Tk):
     def __init__(self):
@@ -1200,8 +3193,15 @@ class AppUnificada(tk.Tk):
         self.title("JQ MOTORS SISTEM")
         self.geometry("1300x800")
         self.configure(bg="white")
-        # DataFrame de inventario (inicializar vacío o cargar desde Excel/CSV)
-        self.inventario_df = pd.DataFrame()  # reemplaza con tu carga real si tienes archivo
+        # Inventario compartido: se lee una vez al arrancar y lo usan todas las pestañas y Flask
+        self.inventario = InventarioStore(ARCHIVO_INVENTARIO)
+        self.inventario.sincronizar()
+        # Cola de envíos a Render en segundo plano
+        self.sincronizador = SincronizadorRender().iniciar()
+        # Hilos para guardar archivos y PDFs sin congelar la ventana
+        self.ejecutor = EjecutorTareas(self)
+        # JSON del inventario listo para Flask, rehecho en segundo plano en cada cambio
+        self.publicador = PublicadorInventario(self.inventario).iniciar()
         # Definir la variable del total
         self.total_var = tk.StringVar()
         self.total_var.set("0.00")
@@ -1212,16 +3212,14 @@ class AppUnificada(tk.Tk):
         # Notebook principal
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill='both', expand=True)
-        # Crear instancias de cada pestaña
-        self.stock_tab = Stock(self.notebook, controller=self)
-        self.ventas_tab = Ventas(self.notebook)
-        self.cot_tab = Cotizacion(self.notebook, controller=self, inventario_df=self.inventario_df)
-        self.taller_tab = Taller(self.notebook)
-        # Añadir pestañas al notebook
-        self.notebook.add(self.stock_tab, text='Stock')
-        self.notebook.add(self.ventas_tab, text='Ventas')
-        self.notebook.add(self.cot_tab, text='Cotizacion')
-        self.notebook.add(self.taller_tab, text='Taller')
+        # Pestañas: un marco vacío por pestaña; el contenido se construye la primera vez que se abre
+        self._pestanas = {}  # marco -> [clase, instancia o None]
+        for nombre, clase in (('Stock', Stock), ('Ventas', Ventas), ('Cotizacion', Cotizacion), ('Taller', Taller)):
+            marco = ttk.Frame(self.notebook)
+            self.notebook.add(marco, text=nombre)
+            self._pestanas[str(marco)] = [clase, None, marco]
+        self.notebook.bind('<<NotebookTabChanged>>', self._al_cambiar_pestana)
+        self.after_idle(self._al_cambiar_pestana)
         # Frame principal para entradas
         self.frame = tk.Frame(self, bg="white")
         self.frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -1238,31 +3236,187 @@ class AppUnificada(tk.Tk):
         # --------------------
         global APP_GLOBAL
         APP_GLOBAL = self
+        self.protocol("WM_DELETE_WINDOW", self.al_cerrar)
+
+    def _al_cambiar_pestana(self, event=None):
+        seleccion = self.notebook.select()
+        if seleccion:
+            self._construir_pestana(seleccion)
+
+    def _construir_pestana(self, marco):
+        pestana = self._pestanas[str(marco)]
+        if pestana[1] is None:
+            clase, _, contenedor = pestana
+            pestana[1] = clase(contenedor, controller=self)
+            pestana[1].pack(fill='both', expand=True)
+        return pestana[1]
+
+    def _pestana(self, clase):
+        for marco, (c, _, _) in self._pestanas.items():
+            if c is clase:
+                return self._construir_pestana(marco)
+
+    @property
+    def stock_tab(self):
+        return self._pestana(Stock)
+
+    @property
+    def ventas_tab(self):
+        return self._pestana(Ventas)
+
+    @property
+    def cot_tab(self):
+        return self._pestana(Cotizacion)
+
+    @property
+    def taller_tab(self):
+        return self._pestana(Taller)
+
+    def al_cerrar(self):
+        # Volcar al Excel los movimientos pendientes del diario antes de salir.
+        # Cada paso por separado: si uno falla (archivo abierto en Excel) los demás se hacen igual;
+        # lo que no se pudo volcar queda en su diario para el siguiente arranque
+        for paso in (self.ejecutor.cerrar, self.inventario.compactar, ALMACEN.volcar_pendientes):
+            try:
+                paso()
+            except Exception as e:
+                print(f"Error al cerrar ({paso.__name__}): {e}")
+        self.destroy()
+
+    @property
+    def inventario_df(self):
+        return self.inventario.df
 
 # --------------------
 # SERVIDOR FLASK
 # --------------------
-app_flask = Flask(__name__)
+app_flask = None  # se crea en crear_app_flask() al arrancar el servidor
+
+LIMITE_MAXIMO_API = 1000  # artículos por página como máximo
+
+def leer_consulta(args):
+    """Parámetros de GET /inventario; lanza ValueError si alguno no es válido."""
+    limite = int(args["limite"]) if args.get("limite") else None
+    if limite is not None and not 1 <= limite <= LIMITE_MAXIMO_API:
+        raise ValueError(f"limite debe estar entre 1 y {LIMITE_MAXIMO_API}")
+    campos = [c.strip() for c in args.get("campos", "").split(",") if c.strip()]
+    stock_menor = args.get("stock_menor")
+    return {
+        "limite": limite,
+        "cursor": args.get("cursor") or None,
+        "campos": campos or None,
+        "prefijo": args.get("prefijo") or None,
+        "ubicacion": args.get("ubicacion") or None,
+        "stock_menor": float(stock_menor) if stock_menor else None,
+    }
+
+class CacheRespuestas:
+    """
+    Cuerpos JSON ya serializados de la versión actual del inventario, por query string.
+    Al cambiar el ETag se vacía: nunca guarda más de una versión.
+    """
+    def __init__(self, maximo=128):
+        self.lock = threading.Lock()
+        self.maximo = maximo
+        self.etag = None
+        self.cuerpos = OrderedDict()
+
+    def obtener(self, etag, clave, generar):
+        with self.lock:
+            if etag != self.etag:
+                self.etag = etag
+                self.cuerpos.clear()
+            cuerpo = self.cuerpos.get(clave)
+            if cuerpo is not None:
+                self.cuerpos.move_to_end(clave)
+                return cuerpo
+        cuerpo = generar()  # fuera del candado: otras consultas no esperan
+        with self.lock:
+            if etag == self.etag:
+                self.cuerpos[clave] = cuerpo
+                if len(self.cuerpos) > self.maximo:
+                    self.cuerpos.popitem(last=False)
+        return cuerpo
+
+CACHE_RESPUESTAS = CacheRespuestas()
 
-@app_flask.route('/inventario', methods=['GET'])
 def inventario_json():
+    from flask import jsonify, request
     try:
-        if 'APP_GLOBAL' in globals():
-            df = APP_GLOBAL.inventario_df
-            data = df.to_dict(orient='records')
-            return jsonify(data)
-        else:
+        if 'APP_GLOBAL' not in globals():
             return jsonify([])
+        try:
+            consulta = leer_consulta(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        completo = not request.args
+        publicador = getattr(APP_GLOBAL, "publicador", None)
+        publicado = publicador.vigente() if publicador is not None and completo else None
+        if publicado is not None:
+            # Inventario completo: bytes ya serializados, sin tocar pandas
+            _, etiqueta, cuerpo, cuerpo_gzip = publicado
+        else:
+            # Toda la petición usa la misma foto: ETag y datos siempre de la misma versión
+            foto = APP_GLOBAL.inventario.foto()
+            etiqueta, cuerpo, cuerpo_gzip = foto.etag, None, None
+        usar_gzip = cuerpo_gzip is not None and "gzip" in request.accept_encodings
+        if usar_gzip:
+            etiqueta += "-gz"  # otra representación (otros bytes): otro ETag
+        if request.if_none_match.contains(etiqueta):
+            respuesta = app_flask.response_class(status=304)
+        else:
+            if cuerpo is None:
+                def generar():
+                    if completo:
+                        return json_inventario_completo(foto)  # mismos bytes que publica el publicador
+                    articulos, siguiente = foto.consultar(**consulta)
+                    # Sin limite ni cursor se responde la lista, como antes
+                    if consulta["limite"] is None and consulta["cursor"] is None:
+                        return serializar_json(articulos)
+                    return serializar_json({"articulos": articulos, "cursor": siguiente})
+                cuerpo = CACHE_RESPUESTAS.obtener(foto.etag, request.query_string, generar)
+            respuesta = app_flask.response_class(cuerpo_gzip if usar_gzip else cuerpo, mimetype="application/json")
+            if usar_gzip:
+                respuesta.headers["Content-Encoding"] = "gzip"
+        respuesta.set_etag(etiqueta)
+        if completo:
+            respuesta.headers["Vary"] = "Accept-Encoding"
+        respuesta.headers["Cache-Control"] = "no-cache"
+        return respuesta
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def iniciar_servidor_flask():
-    app_flask.run(host='0.0.0.0', port=5002, debug=False)
+PUERTO_FLASK = 5002
+HILOS_FLASK = 8
+
+def crear_app_flask():
+    global app_flask
+    if app_flask is None:
+        from flask import Flask
+        app_flask = Flask(__name__)
+        app_flask.add_url_rule('/inventario', view_func=inventario_json, methods=['GET'])
+    return app_flask
+
+def iniciar_servidor_flask(host='0.0.0.0', puerto=PUERTO_FLASK):
+    crear_app_flask()
+    # waitress (requirements.txt); si falta, el servidor de desarrollo de Werkzeug con un hilo por petición
+    try:
+        from waitress import serve
+    except ImportError:
+        from werkzeug.serving import make_server
+        print("AVISO: waitress no está instalado (pip install waitress); "
+              f"/inventario usa el servidor de desarrollo de Werkzeug en {host}:{puerto}")
+        make_server(host, puerto, app_flask, threaded=True).serve_forever()
+    else:
+        serve(app_flask, host=host, port=puerto, threads=HILOS_FLASK)
 
 # --------------------
 # MAIN
 # --------------------
 if __name__ == "__main__":
+    # Necesario si se empaqueta como .exe: los procesos del cierre del día arrancan este mismo archivo
+    multiprocessing.freeze_support()
+
     # Iniciar servidor Flask en segundo plano
     flask_thread = threading.Thread(target=iniciar_servidor_flask, daemon=True)
     flask_thread.start()
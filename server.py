@@ -1,40 +1,271 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from datetime import datetime
+import sqlite3
 import json
+import uuid
 import os
 
 app = Flask(__name__)
 
-DATA_FILE = "inventario_render.json"
+DATA_FILE = "inventario_render.json"  # formato anterior: se migra a la base una sola vez
+DB_FILE = os.environ.get("INVENTARIO_DB", "inventario_render.db")
 
-def guardar_json(data):
-    if not os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "w") as f:
-            json.dump([], f, indent=4)
+# --------------------
+# BASE DE DATOS
+# --------------------
+# historial: cada artículo recibido, en orden de llegada (solo se anexa)
+# inventario: último estado de cada código (upsert por codigo); id_historial sirve de
+#   número de secuencia para /inventario/changes
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS historial (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codigo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    fecha_recepcion TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_historial_codigo ON historial (codigo);
+CREATE TABLE IF NOT EXISTS inventario (
+    codigo TEXT PRIMARY KEY,
+    datos TEXT NOT NULL,
+    fecha_recepcion TEXT NOT NULL,
+    id_historial INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_inventario_secuencia ON inventario (id_historial);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
 
-    with open(DATA_FILE, "r") as f:
-        contenido = json.load(f)
+LIMITE_MAXIMO = 1000  # artículos por página como máximo
 
-    data["fecha_recepcion"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    contenido.append(data)
 
-    with open(DATA_FILE, "w") as f:
-        json.dump(contenido, f, indent=4)
+def conectar():
+    # autocommit: las escrituras abren su propia transacción con BEGIN IMMEDIATE
+    con = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+
+def obtener_db():
+    if "db" not in g:
+        g.db = conectar()
+    return g.db
+
+
+@app.teardown_appcontext
+def cerrar_db(exc):
+    con = g.pop("db", None)
+    if con is not None:
+        con.close()
+
+
+def guardar_registros(con, registros):
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    con.execute("BEGIN IMMEDIATE")  # bloquea a otros escritores (otros workers de gunicorn)
+    try:
+        for data in registros:
+            data = dict(data, fecha_recepcion=fecha)
+            codigo = str(data["codigo"])
+            datos = json.dumps(data, ensure_ascii=False)
+            cur = con.execute("INSERT INTO historial (codigo, datos, fecha_recepcion) VALUES (?, ?, ?)",
+                              (codigo, datos, fecha))
+            con.execute("""
+                INSERT INTO inventario (codigo, datos, fecha_recepcion, id_historial) VALUES (?, ?, ?, ?)
+                ON CONFLICT(codigo) DO UPDATE SET
+                    datos = excluded.datos,
+                    fecha_recepcion = excluded.fecha_recepcion,
+                    id_historial = excluded.id_historial
+            """, (codigo, datos, fecha, cur.lastrowid))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return len(registros)
+
+
+def iniciar_db():
+    con = conectar()
+    try:
+        con.executescript(ESQUEMA)
+        # Identifica esta base en los ETag: si se recrea, los ETag viejos dejan de coincidir
+        con.execute("INSERT OR IGNORE INTO meta VALUES ('id', ?)", (uuid.uuid4().hex[:12],))
+        if not os.path.exists(DATA_FILE):
+            return
+        # Migrar el JSON anterior si la base está vacía (dentro del candado: varios workers arrancan a la vez)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            vacia = con.execute("SELECT 1 FROM historial LIMIT 1").fetchone() is None
+            if vacia and os.path.exists(DATA_FILE):
+                with open(DATA_FILE, "r") as f:
+                    anteriores = [r for r in json.load(f) if isinstance(r, dict) and "codigo" in r]
+                for data in anteriores:
+                    datos = json.dumps(data, ensure_ascii=False)
+                    fecha = data.get("fecha_recepcion", "")
+                    cur = con.execute("INSERT INTO historial (codigo, datos, fecha_recepcion) VALUES (?, ?, ?)",
+                                      (str(data["codigo"]), datos, fecha))
+                    con.execute("INSERT OR REPLACE INTO inventario VALUES (?, ?, ?, ?)",
+                                (str(data["codigo"]), datos, fecha, cur.lastrowid))
+                os.replace(DATA_FILE, DATA_FILE + ".migrado")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+
+
+def validar_registros(registros):
+    if not isinstance(registros, list) or not registros:
+        return "Se esperaba una lista de artículos"
+    for r in registros:
+        if not isinstance(r, dict) or "codigo" not in r:
+            return "Cada artículo debe ser un objeto con 'codigo'"
+    return None
+
+
+iniciar_db()
 
 
 @app.route("/inventario", methods=["POST"])
 def recibir_inventario():
-    data = request.json
-    guardar_json(data)
+    data = request.get_json(silent=True)
+    error = validar_registros([data])
+    if error:
+        return jsonify({"status": "error", "mensaje": error}), 400
+    guardar_registros(obtener_db(), [data])
     return jsonify({"status": "ok", "mensaje": "recibido"})
 
 
+@app.route("/inventario/bulk", methods=["POST"])
+def recibir_inventario_bulk():
+    data = request.get_json(silent=True)
+    registros = data.get("articulos") if isinstance(data, dict) else data
+    error = validar_registros(registros)
+    if error:
+        return jsonify({"status": "error", "mensaje": error}), 400
+    recibidos = guardar_registros(obtener_db(), registros)
+    return jsonify({"status": "ok", "mensaje": "recibido", "recibidos": recibidos})
+
+
+def leer_consulta(args):
+    """Parámetros de GET /inventario; lanza ValueError si alguno no es válido."""
+    limite = int(args["limite"]) if args.get("limite") else None
+    if limite is not None and not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f"limite debe estar entre 1 y {LIMITE_MAXIMO}")
+    campos = [c for c in args.get("campos", "").split(",") if c.strip()]
+    stock_menor = args.get("stock_menor")
+    return {
+        "limite": limite,
+        "cursor": args.get("cursor") or None,
+        "campos": [c.strip() for c in campos] or None,
+        "prefijo": args.get("prefijo") or None,
+        "ubicacion": args.get("ubicacion") or None,
+        "stock_menor": float(stock_menor) if stock_menor else None,
+    }
+
+
+# tabla -> columna por la que se pagina (el cursor es su último valor entregado)
+ORDEN_TABLAS = {"inventario": "codigo", "historial": "id"}
+
+
+def consultar(con, tabla, limite=None, cursor=None, campos=None, prefijo=None, ubicacion=None, stock_menor=None):
+    # Filtra en SQL y pagina con WHERE orden > cursor (sin OFFSET)
+    orden = ORDEN_TABLAS[tabla]
+    condiciones, valores = [], []
+    if cursor is not None:
+        condiciones.append(f"{orden} > ?")
+        valores.append(int(cursor) if orden == "id" else cursor)
+    if prefijo:
+        condiciones.append("codigo LIKE ? ESCAPE '\\'")
+        valores.append(prefijo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if ubicacion:
+        condiciones.append("json_extract(datos, '$.ubicacion') = ? COLLATE NOCASE")
+        valores.append(ubicacion)
+    if stock_menor is not None:
+        condiciones.append("CAST(json_extract(datos, '$.stock') AS REAL) < ?")
+        valores.append(stock_menor)
+    sql = f"SELECT {orden}, datos FROM {tabla}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {orden}"
+    if limite is not None:
+        sql += " LIMIT ?"
+        valores.append(limite + 1)  # uno de más para saber si hay otra página
+    filas = con.execute(sql, valores).fetchall()
+    siguiente = None
+    if limite is not None and len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = str(filas[-1][0])
+    articulos = [json.loads(d) for _, d in filas]
+    if campos:
+        articulos = [{c: a[c] for c in campos if c in a} for a in articulos]
+    return articulos, siguiente
+
+
+def cambios(con, desde, limite):
+    """Estado actual de los códigos que cambiaron después de la secuencia desde."""
+    filas = con.execute("SELECT id_historial, datos FROM inventario WHERE id_historial > ? "
+                        "ORDER BY id_historial LIMIT ?", (desde, limite + 1)).fetchall()
+    mas = len(filas) > limite
+    filas = filas[:limite]
+    hasta = filas[-1][0] if filas else desde
+    return [json.loads(d) for _, d in filas], hasta, mas
+
+
+def etag_inventario(con):
+    # Cambia con cada artículo recibido: historial solo crece
+    base = con.execute("SELECT valor FROM meta WHERE clave = 'id'").fetchone()
+    ultimo = con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'historial'").fetchone()
+    return f"{base[0] if base else ''}-{ultimo[0] if ultimo else 0}"
+
+
+def responder_consulta(tabla):
+    con = obtener_db()
+    etiqueta = etag_inventario(con)
+    if request.if_none_match.contains(etiqueta):
+        respuesta = app.response_class(status=304)
+    else:
+        try:
+            consulta = leer_consulta(request.args)
+            articulos, siguiente = consultar(con, tabla, **consulta)
+        except ValueError as e:
+            return jsonify({"status": "error", "mensaje": str(e)}), 400
+        # Sin limite ni cursor se responde la lista completa, como antes
+        if consulta["limite"] is None and consulta["cursor"] is None:
+            respuesta = jsonify(articulos)
+        else:
+            respuesta = jsonify({"articulos": articulos, "cursor": siguiente})
+    respuesta.set_etag(etiqueta)
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+
 @app.route("/inventario", methods=["GET"])
 def enviar_inventario():
-    if not os.path.exists(DATA_FILE):
-        return jsonify([])
-    with open(DATA_FILE, "r") as f:
-        return jsonify(json.load(f))
+    # Un registro por código, con su último estado
+    return responder_consulta("inventario")
+
+
+@app.route("/inventario/historial", methods=["GET"])
+def enviar_historial():
+    # Todas las versiones recibidas, en orden de llegada
+    return responder_consulta("historial")
+
+
+@app.route("/inventario/changes", methods=["GET"])
+def enviar_cambios():
+    # Sincronización incremental: el cliente guarda "since" y lo manda en la siguiente llamada
+    try:
+        desde = int(request.args.get("since") or 0)
+        limite = int(request.args.get("limite") or LIMITE_MAXIMO)
+        if not 1 <= limite <= LIMITE_MAXIMO:
+            raise ValueError
+    except ValueError:
+        return jsonify({"status": "error", "mensaje": f"since debe ser entero y limite entre 1 y {LIMITE_MAXIMO}"}), 400
+    articulos, hasta, mas = cambios(obtener_db(), desde, limite)
+    return jsonify({"articulos": articulos, "since": hasta, "mas": mas})
 
 
 @app.route("/")